@@ -6,8 +6,105 @@ import shutil
 import sys
 import argparse
 import json
+import time
 from datetime import datetime
 
+
+# Structured progress for the control panel (--progress): one line per event,
+# "=== EXPORT_PROGRESS === {json}". Every target is located and sized before
+# the first copy, so all found events come first (the up-front inventory).
+# Events:
+#   found   {target, files, bytes}            sources located, sizes known
+#   copied  {target, bytes, total}            running byte count while copying
+#   status  {target, status, message, path}   final result for one target
+PROGRESS_MARKER     = "=== EXPORT_PROGRESS ==="
+PROGRESS_INTERVAL_S = 0.25        # copied events are throttled to this rate
+COPY_CHUNK          = 1024 * 1024
+
+
+class ProgressReporter:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._last   = 0.0
+
+    def emit(self, event, **fields):
+        if self.enabled:
+            print(f"{PROGRESS_MARKER} {json.dumps(dict(fields, event=event))}", flush=True)
+
+    def copied(self, target, done, total, final=False):
+        """Throttled 'copied' event; `final` always goes out."""
+        now = time.monotonic()
+        if final or now - self._last >= PROGRESS_INTERVAL_S:
+            self._last = now
+            self.emit('copied', target=target, bytes=done, total=total)
+
+
+progress = ProgressReporter()
+
+
+def folder_size(path):
+    """(file count, total bytes) under `path`."""
+    count, total = 0, 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+                count += 1
+            except OSError:
+                pass
+    return count, total
+
+
+class CopyCounter:
+    """shutil copy_function that copies in chunks and reports the running
+    byte count for one export target."""
+    def __init__(self, target, total):
+        self.target = target
+        self.total  = total
+        self.done   = 0
+
+    def __call__(self, source, destination):
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            while True:
+                chunk = src.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                self.done += len(chunk)
+                progress.copied(self.target, self.done, self.total)
+        shutil.copystat(source, destination)
+        return destination
+
+    def finish(self):
+        progress.copied(self.target, self.done, self.total, final=True)
+
+
+class CopyJob:
+    """One located export target: sized and reported by inventory() before
+    any copying starts, copied by copy() afterwards."""
+    def __init__(self, target, source, destination, overwrite=False):
+        self.target      = target
+        self.source      = source
+        self.destination = destination
+        self.overwrite   = overwrite
+        self.folder      = os.path.isdir(source)
+        self.total       = None
+
+    def inventory(self):
+        """Emit 'found' for this target, unless it will be skipped as existing."""
+        if os.path.exists(self.destination) and not self.overwrite:
+            return
+        try:
+            files, self.total = (folder_size(self.source) if self.folder
+                                 else (1, os.path.getsize(self.source)))
+        except OSError:
+            return      # copy() reports the error
+        progress.emit('found', target=self.target, files=files, bytes=self.total)
+
+    def copy(self):
+        copy = copy_folder if self.folder else copy_file
+        return copy(self.source, self.destination, self.overwrite, self.target, self.total)
+
 class ExportResults:
     def __init__(self):
         self.results = {
@@ -30,6 +127,7 @@ class ExportResults:
                 'message': message,
                 'path': path
             }
+            progress.emit('status', target=file_type, status=status, message=message, path=path)
     
     def write_log(self, log_path):
         """Write results to log file"""
@@ -74,45 +172,52 @@ class ExportResults:
         print("=" * 50 + "\n")
 
 
-def copy_folder(source, destination, overwrite=False):
-    """Copy folder with status return"""
+def copy_folder(source, destination, overwrite=False, target=None, total=None):
+    """Copy folder with status return; `total` is its size if already known"""
     try:
-        if os.path.exists(destination):
-            if overwrite:
-                shutil.rmtree(destination)
-                shutil.copytree(source, destination)
-                return {'status': 'success', 'message': 'Folder copied (overwritten)'}
-            else:
-                return {'status': 'exists', 'message': 'Folder already exists'}
-        else:
-            shutil.copytree(source, destination)
-            return {'status': 'success', 'message': 'Folder copied successfully'}
+        existed = os.path.exists(destination)
+        if existed and not overwrite:
+            return {'status': 'exists', 'message': 'Folder already exists'}
+        if total is None:
+            files, total = folder_size(source)
+            progress.emit('found', target=target, files=files, bytes=total)
+        counter = CopyCounter(target, total)
+        if existed:
+            shutil.rmtree(destination)
+        shutil.copytree(source, destination, copy_function=counter)
+        counter.finish()
+        return {'status': 'success',
+                'message': 'Folder copied (overwritten)' if existed else 'Folder copied successfully'}
     except Exception as e:
         return {'status': 'error', 'message': f'Copy error: {str(e)}'}
 
 
-def copy_file(source, destination, overwrite=False):
-    """Copy file with status return"""
+def copy_file(source, destination, overwrite=False, target=None, total=None):
+    """Copy file with status return; `total` is its size if already known"""
     try:
-        if os.path.exists(destination):
-            if overwrite:
-                shutil.copyfile(source, destination)
-                return {'status': 'success', 'message': 'File copied (overwritten)'}
-            else:
-                return {'status': 'exists', 'message': 'File already exists'}
-        else:
-            shutil.copyfile(source, destination)
-            return {'status': 'success', 'message': 'File copied successfully'}
+        existed = os.path.exists(destination)
+        if existed and not overwrite:
+            return {'status': 'exists', 'message': 'File already exists'}
+        if total is None:
+            total = os.path.getsize(source)
+            progress.emit('found', target=target, files=1, bytes=total)
+        counter = CopyCounter(target, total)
+        counter(source, destination)
+        counter.finish()
+        return {'status': 'success',
+                'message': 'File copied (overwritten)' if existed else 'File copied successfully'}
     except Exception as e:
         return {'status': 'error', 'message': f'Copy error: {str(e)}'}
 
 
 def export_fnirs_data(subject_id, nirx_path, dest_root, results, overwrite=False):
-    """Find and export fNIRS folders based on subject ID and experiment type"""
+    """Find fNIRS folders based on subject ID and experiment type; returns
+    their CopyJobs"""
+    jobs = []
     if not nirx_path or not os.path.exists(nirx_path):
         results.set_file_result('fnirs_nback', 'error', 'NIRx data path not found')
         results.set_file_result('fnirs_fingertapping', 'error', 'NIRx data path not found')
-        return
+        return jobs
     
     try:
         found_nback = False
@@ -134,14 +239,12 @@ def export_fnirs_data(subject_id, nirx_path, dest_root, results, overwrite=False
                     
                     if 'nback' in content.lower() and not found_nback:
                         dest_folder = os.path.join(dest_root, 'NIR_DAT', f'{subject_id}_NIR_NBK')
-                        status = copy_folder(source_folder, dest_folder, overwrite)
-                        results.set_file_result('fnirs_nback', status['status'], status['message'], dest_folder)
+                        jobs.append(CopyJob('fnirs_nback', source_folder, dest_folder, overwrite))
                         found_nback = True
                     
                     if 'fingertapping' in content.lower() and not found_fingertapping:
                         dest_folder = os.path.join(dest_root, 'NIR_DAT', f'{subject_id}_NIR_FTP')
-                        status = copy_folder(source_folder, dest_folder, overwrite)
-                        results.set_file_result('fnirs_fingertapping', status['status'], status['message'], dest_folder)
+                        jobs.append(CopyJob('fnirs_fingertapping', source_folder, dest_folder, overwrite))
                         found_fingertapping = True
                     
                     if found_nback and found_fingertapping:
@@ -163,14 +266,17 @@ def export_fnirs_data(subject_id, nirx_path, dest_root, results, overwrite=False
         error_msg = f"fNIRS search error: {str(e)}"
         results.set_file_result('fnirs_nback', 'error', error_msg)
         results.set_file_result('fnirs_fingertapping', 'error', error_msg)
+        return []
+    return jobs
 
 
 def export_eeg_data(subject_id, eeg_path, dest_root, results, overwrite=False):
-    """Find and export EEG files"""
+    """Find EEG files; returns their CopyJobs"""
+    jobs = []
     if not eeg_path or not os.path.exists(eeg_path):
         results.set_file_result('eeg_data', 'error', 'EEG data path not found')
         results.set_file_result('eeg_markers', 'error', 'EEG data path not found')
-        return
+        return jobs
     
     try:
         files = os.listdir(eeg_path)
@@ -180,8 +286,7 @@ def export_eeg_data(subject_id, eeg_path, dest_root, results, overwrite=False):
         if edf_files:
             source_path = os.path.join(eeg_path, edf_files[0])
             dest_path = os.path.join(dest_root, 'EEG_DAT', f'{subject_id}_EEG_NBK_DAT.edf')
-            status = copy_file(source_path, dest_path, overwrite)
-            results.set_file_result('eeg_data', status['status'], status['message'], dest_path)
+            jobs.append(CopyJob('eeg_data', source_path, dest_path, overwrite))
         else:
             results.set_file_result('eeg_data', 'not_found', 'No EEG data file found')
         
@@ -190,8 +295,7 @@ def export_eeg_data(subject_id, eeg_path, dest_root, results, overwrite=False):
         if csv_files:
             source_path = os.path.join(eeg_path, csv_files[0])
             dest_path = os.path.join(dest_root, 'EEG_DAT', f'{subject_id}_EEG_NBK_MRK.csv')
-            status = copy_file(source_path, dest_path, overwrite)
-            results.set_file_result('eeg_markers', status['status'], status['message'], dest_path)
+            jobs.append(CopyJob('eeg_markers', source_path, dest_path, overwrite))
         else:
             results.set_file_result('eeg_markers', 'not_found', 'No EEG markers file found')
             
@@ -199,6 +303,8 @@ def export_eeg_data(subject_id, eeg_path, dest_root, results, overwrite=False):
         error_msg = f"EEG search error: {str(e)}"
         results.set_file_result('eeg_data', 'error', error_msg)
         results.set_file_result('eeg_markers', 'error', error_msg)
+        return []
+    return jobs
 
 
 def export_data(subject_id, project_root, nirx_path, eeg_path, overwrite=False):
@@ -214,9 +320,14 @@ def export_data(subject_id, project_root, nirx_path, eeg_path, overwrite=False):
     os.makedirs(os.path.join(dest_root, 'EEG_DAT'), exist_ok=True)
     os.makedirs(os.path.join(dest_root, 'NIR_DAT'), exist_ok=True)
     
-    # Export data
-    export_fnirs_data(subject_id, nirx_path, dest_root, results, overwrite)
-    export_eeg_data(subject_id, eeg_path, dest_root, results, overwrite)
+    # Locate and size everything first, then copy
+    jobs = (export_fnirs_data(subject_id, nirx_path, dest_root, results, overwrite) +
+            export_eeg_data(subject_id, eeg_path, dest_root, results, overwrite))
+    for job in jobs:
+        job.inventory()
+    for job in jobs:
+        status = job.copy()
+        results.set_file_result(job.target, status['status'], status['message'], job.destination)
     
     return results
 
@@ -310,8 +421,11 @@ if __name__ == "__main__":
     parser.add_argument('--nirx_data', help='NIRx data directory')
     parser.add_argument('--eeg_data', help='EEG data directory')
     parser.add_argument('--overwrite', action='store_true', help='Overwrite existing files')
+    parser.add_argument('--progress', action='store_true',
+                        help='Stream JSON progress lines (found / copied / status) for the control panel')
     
     args = parser.parse_args()
+    progress.enabled = args.progress
     
     try:
         # If all required args provided, run with args; otherwise interactive
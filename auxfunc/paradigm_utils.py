@@ -5,18 +5,33 @@ Utility functions for the GeroScience Lab paradigms.
 Created by: zkaposzt @ OU
 """
 
-import pygame, json, time, os
+import json, time, os, re, csv, threading, atexit, importlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-# Windows keypress imports
+_pygame_import_ms = time.perf_counter()     # recorded in the startup profile
+import pygame
+_pygame_import_ms = (time.perf_counter() - _pygame_import_ms) * 1000
+
+# Windows keypress imports (pywin32 only: pyautogui pulled in PIL and friends
+# at startup just to tap Alt, see _tap_alt)
 try:
     import win32gui
     import win32con
     from win32api import keybd_event
-    import pyautogui
     _WIN32_AVAILABLE = True
 except ImportError:
     _WIN32_AVAILABLE = False
 
+VK_MENU = 0x12
+
+def _tap_alt():
+    """Alt press/release: lets SetForegroundWindow steal focus (Win32's
+    foreground lock), without pyautogui's 100 ms post-call pause."""
+    keybd_event(VK_MENU, 0, 0, 0)
+    keybd_event(VK_MENU, 0, win32con.KEYEVENTF_KEYUP, 0)
+
 def load_strings(language, paradigm):
     """Load the text table for `paradigm` in `language` from configs/strings.json.
     Always read as UTF-8 (Spanish accents / inverted punctuation). Any key that is
@@ -37,6 +52,7 @@ def load_strings(language, paradigm):
     base = dict(data.get('en', {}).get(paradigm, {}))   # English baseline
     loc  = data.get(lang, {}).get(paradigm, {})
     base.update({k: v for k, v in loc.items() if v not in (None, "", [])})
+    layouts.clear()     # composed screens hold the previous language's text
     return base
 
 
@@ -51,23 +67,154 @@ VK_MAP = {
 # Global LSL outlet variable
 _lsl_outlet = None
 
+# ---- Window resolver ------------------------------------------------------- #
+class Win32WindowBackend:
+    """Top-level windows of the Win32 desktop."""
+    def windows(self):
+        found = []
+        def cb(hwnd, found):
+            found.append((hwnd, win32gui.GetWindowText(hwnd)))
+            return True
+        win32gui.EnumWindows(cb, found)
+        return found
+
+    def find_exact(self, title):
+        return win32gui.FindWindow(None, title) or None
+
+    def is_window(self, hwnd):
+        return bool(win32gui.IsWindow(hwnd))
+
+    def title(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+
+
+class StandInWindowBackend:
+    """In-memory window table for non-Windows hosts and headless runs; add()
+    and close() windows to exercise the resolver without a desktop."""
+    def __init__(self):
+        self._titles = {}
+        self._next   = 1
+
+    def add(self, title):
+        hwnd, self._next = self._next, self._next + 1
+        self._titles[hwnd] = title
+        return hwnd
+
+    def close(self, hwnd):
+        self._titles.pop(hwnd, None)
+
+    def windows(self):
+        return list(self._titles.items())
+
+    def find_exact(self, title):
+        return next((h for h, t in self._titles.items() if t == title), None)
+
+    def is_window(self, hwnd):
+        return hwnd in self._titles
+
+    def title(self, hwnd):
+        return self._titles.get(hwnd, '')
+
+
+class WindowResolver:
+    """
+    Title (fragment) -> hwnd lookups for keystroke triggers and focus. A cached
+    handle is re-validated cheaply (IsWindow + title recheck) and the desktop
+    is only enumerated on a miss or after invalidate(). Titles that were not
+    found are not searched for again for `miss_ttl_s`, so an absent target
+    doesn't cost a full enumeration on every trigger.
+    """
+    def __init__(self, backend=None, miss_ttl_s=2.0):
+        self.miss_ttl_s = miss_ttl_s
+        self._lock      = threading.Lock()
+        self.set_backend(backend or (Win32WindowBackend() if _WIN32_AVAILABLE
+                                     else StandInWindowBackend()))
+
+    def set_backend(self, backend):
+        self.backend = backend
+        self.invalidate()
+        self.hits = self.negative_hits = self.misses = self.stale = self.scans = 0
+        self.scan_s = 0.0
+
+    def invalidate(self, fragment=None):
+        """Forget cached handles for `fragment` (all titles if None)."""
+        with self._lock:
+            if fragment is None:
+                self._cache, self._absent = {}, {}
+            else:
+                for key in [k for k in self._cache if k[0] == fragment]:
+                    del self._cache[key]
+                for key in [k for k in self._absent if k[0] == fragment]:
+                    del self._absent[key]
+
+    def find(self, fragment, exact=False):
+        """hwnd of the first window whose title contains `fragment` (equals it
+        with `exact`), or None."""
+        key = (fragment, exact)
+        with self._lock:
+            hwnd = self._cache.get(key)
+            if hwnd is not None:
+                try:
+                    title = self.backend.title(hwnd) if self.backend.is_window(hwnd) else None
+                except Exception:
+                    title = None
+                if title is not None and (title == fragment if exact else fragment in title):
+                    self.hits += 1
+                    return hwnd
+                self.stale += 1
+                del self._cache[key]
+            missed_at = self._absent.get(key)
+            if missed_at is not None and time.perf_counter() - missed_at < self.miss_ttl_s:
+                self.negative_hits += 1     # remembered absence, not a found window
+                return None
+            self.misses += 1
+            hwnd = self._scan(fragment, exact)
+            if hwnd is None:
+                self._absent[key] = time.perf_counter()
+            else:
+                self._cache[key] = hwnd
+                self._absent.pop(key, None)
+            return hwnd
+
+    def _scan(self, fragment, exact):
+        start = time.perf_counter()
+        try:
+            if exact:
+                return self.backend.find_exact(fragment)
+            return next((h for h, t in self.backend.windows() if fragment in t), None)
+        except Exception as e:
+            print(f"WindowResolver: lookup of '{fragment}' failed ({e})")
+            return None
+        finally:
+            self.scans  += 1
+            self.scan_s += time.perf_counter() - start
+
+    def stats(self):
+        return {'hits': self.hits, 'negative_hits': self.negative_hits,
+                'misses': self.misses, 'stale': self.stale, 'scans': self.scans,
+                'scan_ms_avg': round(self.scan_s * 1000 / self.scans, 3) if self.scans else 0.0}
+
+
+# Shared instance for trigger delivery and focus handling
+windows = WindowResolver()
+
+
 # ---- Win32 helpers (no-op on other platforms) ------------------------------ #
+# Lookups go through whatever backend `windows` has installed (the
+# StandInWindowBackend off Windows / headless), not the Win32 flag.
 def _find_window_partial(partial_name):
-    if not _WIN32_AVAILABLE:
-        return None
-    results = []
-    def cb(hwnd, results):
-        if partial_name in win32gui.GetWindowText(hwnd):
-            results.append(hwnd)
-        return True
-    win32gui.EnumWindows(cb, results)
-    return results[0] if results else None
+    return windows.find(partial_name)
+
+
+def find_window(window_name):
+    """Exact-title window handle from the installed backend, or None."""
+    return windows.find(window_name, exact=True)
 
 
 def _ensure_focus(hwnd, max_attempts=20, delay_ms=50):
     if not _WIN32_AVAILABLE or hwnd is None:
         return False
-    pyautogui.press("alt")  # Win32 focus-stealing workaround
+    _tap_alt()  # Win32 focus-stealing workaround
     for _ in range(max_attempts):
         try:
             win32gui.SetForegroundWindow(hwnd)
@@ -76,42 +223,36 @@ def _ensure_focus(hwnd, max_attempts=20, delay_ms=50):
             time.sleep(delay_ms / 1000)
     return False
 
-# ---- The manager ---------------------------------------------------------- #
-class TriggerManager:
-    """Fan a trigger out to every attached modality in a single send(), each on
-    its own transport. Routing is per-program, not a single global method:
-    LSL is used only where it registers reliably (e.g. NIRStar), simulated
-    keypresses everywhere else. This restores the pre-v4.0 behavior.
+# ---- Trigger transports ---------------------------------------------------- #
+class TriggerTransport:
+    """
+    One way of delivering a marker. `name` is what a program's 'transport'
+    refers to; `fast` transports (no window juggling) go out first, on the
+    fast lane. deliver(prog, value, at) raises on failure and may return a
+    transport-side timestamp worth logging (e.g. the LSL clock); `at` is the
+    now() time of the event being marked. A transport that can push several
+    markers in one call also defines deliver_chunk([(prog, value), ...], at).
+    """
+    name      = None
+    fast      = True
+    available = False
 
-    Each entry in `programs` may specify:
-        window    : partial window title (keystroke / focus target)
-        key       : key to press for keystroke transport (e.g. 'F8', '8')
-        transport : 'keystroke' (default) | 'lsl' | 'ttl'
-        value     : marker value for lsl/ttl (default: send()'s `value` arg)
+    def deliver(self, prog, value, at):
+        raise NotImplementedError
 
-    A program set to 'lsl'/'ttl' falls back to its `key` (keystroke) if that
-    transport isn't available, mirroring the old `if use_lsl else keystroke`.
-    """
-    def __init__(self, use_lsl=True, programs=None, pulse_ms=50,
-                 lsl_source_id='paradigm_triggers'):
-        self.programs   = programs or []
-        self._ttl_dev   = None
-        self._lsl_out   = None
+    def close(self):
+        pass
 
-        self._init_ttl(pulse_ms)
-        if use_lsl:
-            self._init_lsl(lsl_source_id)
 
-        _targets = [(p.get('window'), p.get('transport', 'keystroke'))
-                    for p in self.programs]
-        print(f"TriggerManager: per-program routing "
-              f"(ttl={self._ttl_dev is not None}, "
-              f"lsl={self._lsl_out is not None}, "
-              f"targets={_targets})")
+class TTLTransport(TriggerTransport):
+    """Cedrus XID (pyxid2) TTL line."""
+    name = 'ttl'
 
-    def _init_ttl(self, pulse_ms):
+    def __init__(self, pulse_ms=50):
+        self._dev = None
+        self._io  = threading.Lock()    # trigger lane vs. clock sampling
         try:
-            import pyxid2
+            pyxid2 = startup.import_module('pyxid2')
         except ImportError:
             print("TriggerManager: pyxid2 not installed; skipping TTL")
             return
@@ -123,134 +264,580 @@ class TriggerManager:
             dev = devices[0]
             dev.reset_base_timer()
             dev.set_pulse_duration(pulse_ms)
-            self._ttl_dev = dev
+            self._dev = dev
+            clock_sync.add_source('xid', self._read_timer)
             print(f"TriggerManager: TTL ready -> {dev}")
         except Exception as e:
             print(f"TriggerManager: TTL init failed -> {e}")
-            self._ttl_dev = None
+            self._dev = None
+
+    @property
+    def available(self):
+        return self._dev is not None
+
+    def deliver(self, prog, value, at):
+        with self._io:
+            self._dev.activate_line(bitmask=value)
 
-    def _init_lsl(self, source_id):
+    def _read_timer(self):
+        """XID base timer in seconds (None on XID1 firmware, which can't be
+        queried)."""
+        if self._dev is None:
+            return None
+        query = getattr(self._dev, 'query_timer', None) or self._dev.query_base_timer
+        with self._io:
+            ms = query()
+        return ms / 1000 if ms is not None and ms >= 0 else None
+
+    def close(self):
+        if self._dev is not None:
+            try:
+                self._dev.con.close()
+            except Exception as e:
+                print(f"TriggerManager: error closing TTL ({e})")
+            self._dev = None
+
+
+class LSLTransport(TriggerTransport):
+    """LSL marker outlet. Samples carry the event time `at`, converted from
+    the now() clock to LSL local_clock() time, rather than the time of the
+    push (which may be well after the flip it marks).
+
+    With `relay` (udp://host:port) no outlet is opened here: each marker goes
+    as a 'value,stamp,sent' line to the control panel, which owns the
+    TriggerStream outlet all day and pushes it with the same stamp."""
+    name = 'lsl'
+
+    def __init__(self, source_id='paradigm_triggers', enabled=True, relay=None):
+        self._out   = None
+        self._pylsl = None
+        self._relay = None
+        if not enabled:
+            return
         try:
-            import pylsl
+            pylsl = startup.import_module('pylsl')
         except ImportError:
             print("TriggerManager: pylsl not installed; skipping LSL")
             return
+        if relay:
+            self._open_relay(pylsl, relay)
+            return
         try:
             info = pylsl.StreamInfo(
                 name='TriggerStream', type='Markers',
                 channel_count=1, nominal_srate=0,
                 channel_format='int32', source_id=source_id,
             )
-            self._lsl_out = pylsl.StreamOutlet(info)
+            self._out   = pylsl.StreamOutlet(info)
+            self._pylsl = pylsl
+            clock_sync.add_source('lsl', pylsl.local_clock)
             print("TriggerManager: LSL stream open")
         except Exception as e:
             print(f"TriggerManager: LSL init failed -> {e}")
-            self._lsl_out = None
+            self._out = None
 
-    # ---- access point for the paradigm ---------------------------------- #
-    def send(self, value=8, return_focus_to=None):
-        """Fan the trigger out to every program on its own transport, in one
-        call. Returns the set of transports that actually fired."""
-        fired = set()
-        for prog in self.programs:
-            transport = prog.get('transport', 'keystroke').lower()
-            mval      = int(prog.get('value', value))
-
-            # ttl -> lsl -> keystroke per-program fallback
-            if transport == 'ttl':
-                if self._ttl_dev is not None and self._send_ttl(mval):
-                    fired.add('ttl');       continue
-                transport = 'lsl'           # demote this program only
-            if transport == 'lsl':
-                if self._lsl_out is not None and self._send_lsl(mval):
-                    fired.add('lsl');       continue
-                transport = 'keystroke'     # demote this program only
-            if transport == 'keystroke':
-                if self._send_keystroke_one(prog):
-                    fired.add('keystroke')
-
-        if return_focus_to:
-            hwnd = _find_window_partial(return_focus_to)
-            if hwnd is not None:
-                _ensure_focus(hwnd)
+    def _open_relay(self, pylsl, relay):
+        """Check the panel's relay answers (ping/pong) before routing to it."""
+        import socket
+        host, port = relay[len('udp://'):].rsplit(':', 1)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(0.5)
+        try:
+            sock.connect((host, int(port)))
+            t0 = pylsl.local_clock()
+            sock.send(b'ping')
+            if sock.recv(16) != b'pong':
+                raise OSError("unexpected reply")
+            rtt_ms = (pylsl.local_clock() - t0) * 1000
+        except OSError as e:
+            print(f"TriggerManager: LSL relay {relay} not answering ({e}); skipping LSL")
+            sock.close()
+            return
+        self._relay = sock
+        self._pylsl = pylsl
+        clock_sync.add_source('lsl', pylsl.local_clock)
+        print(f"TriggerManager: LSL via control panel relay ({rtt_ms:.2f} ms round trip)")
 
-        return fired or {'none'}
+    @property
+    def available(self):
+        return self._out is not None or self._relay is not None
 
-    # ---- per-transport primitives --------------------------------------- #
-    def _send_ttl(self, value):
-        try:
-            self._ttl_dev.activate_line(bitmask=int(value))
-            return True
-        except Exception as e:
-            print(f"TriggerManager: TTL send failed ({e}); falling back")
-            return False
+    def _lsl_time(self, at):
+        return self._pylsl.local_clock() - (now() - at)
 
-    def _send_lsl(self, value):
-        try:
-            self._lsl_out.push_sample([int(value)])
-            return True
-        except Exception as e:
-            print(f"TriggerManager: LSL send failed ({e}); falling back")
-            return False
+    def _send_relay(self, lines):
+        sent = self._pylsl.local_clock()
+        self._relay.send("".join(f"{value},{stamp:.6f},{sent:.6f}\n"
+                                 for value, stamp in lines).encode())
 
-    def _send_keystroke_one(self, prog):
-        if not _WIN32_AVAILABLE:
-            return False
+    def deliver(self, prog, value, at):
+        stamp = self._lsl_time(at)
+        if self._relay is not None:
+            self._send_relay([(value, stamp)])
+        else:
+            self._out.push_sample([value], stamp)
+        return stamp
+
+    def deliver_chunk(self, items, at):
+        stamp = self._lsl_time(at)
+        if self._relay is not None:
+            self._send_relay([(value, stamp) for _, value in items])
+        else:
+            self._out.push_chunk([[value] for _, value in items], [stamp] * len(items))
+        return stamp
+
+    def close(self):
+        if self._relay is not None:
+            self._relay.close()
+            self._relay = None
+        if self._out is not None:
+            try:
+                del self._out
+            except Exception as e:
+                print(f"TriggerManager: error closing LSL ({e})")
+            self._out = None
+
+
+class KeystrokeTransport(TriggerTransport):
+    """Simulated key press into the program's window (Win32 only)."""
+    name = 'keystroke'
+    fast = False
+
+    @property
+    def available(self):
+        return _WIN32_AVAILABLE
+
+    def deliver(self, prog, value, at):
         window = prog.get('window', '')
         key    = prog.get('key', 'F8')
         vk     = VK_MAP.get(key.upper())
         if vk is None:
-            print(f"TriggerManager: unknown key '{key}' for {window}")
-            return False
+            raise ValueError(f"unknown key '{key}'")
         hwnd = _find_window_partial(window)
         if hwnd is None:
-            print(f"TriggerManager: window '{window}' not found")
-            return False
+            raise LookupError("window not found")
         try:
             _ensure_focus(hwnd)
             keybd_event(vk, 0, 0, 0)
             time.sleep(0.01)
             keybd_event(vk, 0, win32con.KEYEVENTF_KEYUP, 0)
+        except Exception:
+            windows.invalidate(window)      # re-resolve next time
+            raise
+
+
+class LoopbackTransport(TriggerTransport):
+    """In-memory sink for tests / headless runs: keeps (event time, window,
+    value) for every delivery in `sent`."""
+    name      = 'loopback'
+    available = True
+
+    def __init__(self):
+        self.sent = []
+
+    def deliver(self, prog, value, at):
+        self.sent.append((at, prog.get('window', ''), value))
+        return at
+
+    def deliver_chunk(self, items, at):
+        self.sent.extend((at, prog.get('window', ''), value) for prog, value in items)
+        return at
+
+
+class FileTransport(TriggerTransport):
+    """Writes 'event time,window,value' lines to the program's 'target': a
+    file path, or udp://host:port to send each line as a datagram."""
+    name      = 'file'
+    available = True
+
+    def __init__(self):
+        self._files  = {}
+        self._socket = None
+
+    def deliver(self, prog, value, at):
+        target = prog.get('target', 'triggers.log')
+        line   = f"{at:.6f},{prog.get('window', '')},{value}\n"
+        if target.startswith('udp://'):
+            import socket
+            host, port = target[len('udp://'):].rsplit(':', 1)
+            if self._socket is None:
+                self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.sendto(line.encode(), (host, int(port)))
+        else:
+            f = self._files.get(target)
+            if f is None:
+                f = self._files[target] = open(target, 'a')
+            f.write(line)
+            f.flush()
+        return at
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+# Transport name -> class, for the 'transport' field of keystroke_programs
+TRANSPORTS = {cls.name: cls for cls in (TTLTransport, LSLTransport, KeystrokeTransport,
+                                        LoopbackTransport, FileTransport)}
+
+# Where a program goes when its transport is unavailable or fails
+FALLBACK = {'ttl': 'lsl', 'lsl': 'keystroke'}
+
+
+# ---- The manager ---------------------------------------------------------- #
+class TriggerHandle:
+    """Outcome of one TriggerManager.send(). `requested` is the now() time of
+    the call and `at` the time of the event it marks (the request time unless
+    send() was given a timestamp); `completed` maps each transport that fired to the now() time its
+    (last) delivery finished, and `records` holds one delivery record per
+    program (see TriggerManager). Asynchronous sends fill these in from the
+    worker lanes; wait() blocks until they are done."""
+    def __init__(self, value, label=None, at=None):
+        self.value     = value
+        self.label     = label
+        self.requested = now()
+        self.at        = self.requested if at is None else at
+        self.completed = {}
+        self.records   = []
+        self._done     = threading.Event()
+
+    def _record(self, window, route):
+        rec = {'window': window, 'route': route, 'transport': 'none', 'ok': False,
+               'start': None, 'end': None, 'stamp': None, 'fallback': []}
+        self.records.append(rec)
+        return rec
+
+    def _mark(self, transport):
+        self.completed[transport] = now()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def fired(self):
+        """Set of transports that actually fired (send()'s old return value)."""
+        return set(self.completed) or {'none'}
+
+    def latency_ms(self):
+        return {t: round((c - self.requested) * 1000, 3) for t, c in self.completed.items()}
+
+
+class TriggerManager:
+    """Fan a trigger out to every attached modality in a single send(), each on
+    its own transport. Routing is per-program, not a single global method:
+    LSL is used only where it registers reliably (e.g. NIRStar), simulated
+    keypresses everywhere else. This restores the pre-v4.0 behavior.
+
+    Each entry in `programs` may specify:
+        window    : partial window title (keystroke / focus target)
+        key       : key to press for keystroke transport (e.g. 'F8', '8')
+        transport : 'keystroke' (default) | 'lsl' | 'ttl' | 'loopback' | 'file'
+        value     : marker value for lsl/ttl (default: send()'s `value` arg)
+        target    : output file or udp://host:port for the 'file' transport
+
+    A program set to 'lsl'/'ttl' falls back to its `key` (keystroke) if that
+    transport isn't available, mirroring the old `if use_lsl else keystroke`
+    (see FALLBACK). `transports` adds or replaces TriggerTransport instances
+    by name.
+
+    The programs are compiled once into a dispatch plan: per program the
+    chain of available transports' deliver callables, in fallback order.
+    send() just walks that plan; it is recompiled only when a transport's
+    availability changes. Programs whose first transport can push chunks
+    (LSL) go out together in one push.
+
+    send(timestamp=...) marks an event that already happened, e.g. the
+    flip that showed a stimulus (Scene.last_flip): LSL samples are stamped
+    with that time instead of the time of the push.
+
+    With `async_dispatch`, send() returns at once and delivery runs on two
+    single-thread lanes: fast transports (TTL/LSL) first on the fast lane,
+    then keystrokes (and any fallbacks, plus the focus return) in order on
+    the keystroke lane, so the frame loop never waits on window enumeration
+    or focus stealing.
+
+    Every send is kept in `log`: per program the configured route, the
+    transport it resolved to after demotion, start/end of that delivery, the
+    reasons for each fallback and any transport-side stamp (the LSL
+    local_clock() pushed). close() prints latency statistics and can write
+    the log to CSV.
+
+    `lsl_relay` (udp://host:port) sends LSL markers through the control
+    panel's long-lived outlet instead of opening one here.
+    """
+    def __init__(self, use_lsl=True, programs=None, pulse_ms=50,
+                 lsl_source_id='paradigm_triggers', async_dispatch=False,
+                 transports=None, lsl_relay=None):
+        self.programs   = programs or []
+        self.log        = []
+        self._inflight  = 0
+        self._lock      = threading.Lock()
+        self._fast_lane = self._key_lane = None
+        if async_dispatch:
+            self._fast_lane = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trigger-fast')
+            self._key_lane  = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trigger-keys')
+
+        self.transports = {
+            'ttl':       TTLTransport(pulse_ms),
+            'lsl':       LSLTransport(lsl_source_id, enabled=use_lsl, relay=lsl_relay),
+            'keystroke': KeystrokeTransport(),
+        }
+        self.transports.update(transports or {})
+        for prog in self.programs:
+            name = prog.get('transport', 'keystroke').lower()
+            if name not in self.transports and name in TRANSPORTS:
+                self.transports[name] = TRANSPORTS[name]()
+        self._compile()
+
+        _targets = [(p.get('window'), p.get('transport', 'keystroke'))
+                    for p in self.programs]
+        print(f"TriggerManager: per-program routing "
+              f"(ttl={self.transports['ttl'].available}, "
+              f"lsl={self.transports['lsl'].available}, "
+              f"async={async_dispatch}, "
+              f"targets={_targets})")
+
+    # ---- dispatch plan --------------------------------------------------- #
+    def _availability(self):
+        return tuple(t.available for t in self.transports.values())
+
+    def _compile(self):
+        """Resolve every program once: (prog, window, route, value, chain),
+        where chain is [(name, deliver, fast, deliver_chunk), ...] in fallback
+        order, with deliver None for a transport that is unavailable."""
+        plan = []
+        for prog in self.programs:
+            route = prog.get('transport', 'keystroke').lower()
+            value = int(prog['value']) if 'value' in prog else None
+            chain, name = [], route
+            while name is not None:
+                transport = self.transports.get(name)
+                if transport is None:
+                    print(f"TriggerManager: unknown transport '{name}' for {prog.get('window')}")
+                if transport is None or not transport.available:
+                    chain.append((name, None, True, None))
+                else:
+                    chain.append((name, transport.deliver, transport.fast,
+                                  getattr(transport, 'deliver_chunk', None)))
+                name = FALLBACK.get(name)
+            plan.append((prog, prog.get('window', ''), route, value, tuple(chain)))
+        self._plan  = plan
+        self._avail = self._availability()
+
+    # ---- access point for the paradigm ---------------------------------- #
+    def send(self, value=8, return_focus_to=None, label=None, timestamp=None, lane=None):
+        """Fan the trigger out to every program on its own transport, in one
+        call. `label` names the event in the delivery log; `timestamp` is its
+        now() time if it already happened (default: now). `lane` restricts the
+        send to programs whose transport is 'fast' (TTL/LSL/...) or 'slow'
+        (keystrokes), so the two can go out at different moments. Returns a
+        TriggerHandle; unless dispatch is asynchronous it is already complete."""
+        handle = TriggerHandle(value, label, timestamp)
+        if self._availability() != self._avail:
+            self._compile()
+        jobs = [(prog, value if pval is None else pval, chain, handle._record(window, route))
+                for prog, window, route, pval, chain in self._plan
+                if lane is None or (lane == 'fast') == self._is_fast(chain)]
+        if not jobs:
+            handle._done.set()
+            return handle
+        self.log.append(handle)
+
+        if self._fast_lane is None:
+            self._deliver_slow(handle, self._deliver_fast(handle, jobs), return_focus_to)
+            return handle
+        with self._lock:
+            self._inflight += 1
+        self._fast_lane.submit(self._dispatch, handle, jobs, return_focus_to)
+        return handle
+
+    def has_slow(self):
+        """True if any program currently resolves to a slow (keystroke) transport."""
+        if self._availability() != self._avail:
+            self._compile()
+        return not all(self._is_fast(chain) for _, _, _, _, chain in self._plan)
+
+    @staticmethod
+    def _is_fast(chain):
+        step = next((step for step in chain if step[1] is not None), None)
+        return step is None or step[2]
+
+    def busy(self):
+        """True while an asynchronous send is still being delivered (e.g. to
+        hold the focus watchdog off while keystrokes move focus around)."""
+        return self._inflight > 0
+
+    def _dispatch(self, handle, jobs, return_focus_to):
+        jobs = self._deliver_fast(handle, jobs)
+        self._key_lane.submit(self._deliver_slow, handle, jobs, return_focus_to)
+
+    def _attempt(self, handle, recs, name, deliver, *args):
+        """One delivery attempt (of one or several markers), logged into each
+        of `recs`."""
+        start = now()
+        try:
+            stamp = deliver(*args)
+            error = None
+        except Exception as e:
+            error = e
+            print(f"TriggerManager: {name} to {', '.join(r['window'] for r in recs)} failed ({e})")
+        end = now()
+        for rec in recs:
+            rec['transport'], rec['start'], rec['end'] = name, start, end
+            if error is None:
+                rec['ok'], rec['stamp'] = True, stamp
+            else:
+                rec['fallback'].append(f"{name} failed: {error}")
+        if error is None:
+            handle._mark(name)
+        return error is None
+
+    def _deliver_fast(self, handle, jobs):
+        """Walk each chain while its transports are fast; returns the jobs
+        left for the keystroke lane (with the rest of their chain)."""
+        begin  = [0] * len(jobs)        # where each job's chain walk resumes
+        groups = {}
+        for i, (_, _, chain, rec) in enumerate(jobs):
+            k = next((k for k, step in enumerate(chain) if step[1] is not None), None)
+            if k is not None and chain[k][2] and chain[k][3] is not None:
+                groups.setdefault(chain[k][0], []).append((i, k))
+        for name, members in groups.items():
+            if len(members) < 2:
+                continue
+            # Several markers on one chunk-capable transport: a single push
+            for i, k in members:
+                self._skip_unavailable(jobs[i][2][:k], jobs[i][3])
+            i0, k0 = members[0]
+            ok = self._attempt(handle, [jobs[i][3] for i, _ in members], name,
+                               jobs[i0][2][k0][3],
+                               [(jobs[i][0], jobs[i][1]) for i, _ in members], handle.at)
+            for i, k in members:
+                begin[i] = None if ok else k + 1
+
+        left = []
+        for i, (prog, value, chain, rec) in enumerate(jobs):
+            if begin[i] is None:
+                continue
+            for j in range(begin[i], len(chain)):
+                name, deliver, fast, _ = chain[j]
+                if deliver is None:
+                    rec['fallback'].append(f"{name} unavailable")
+                elif not fast:
+                    left.append((prog, value, chain[j:], rec))
+                    break
+                elif self._attempt(handle, [rec], name, deliver, prog, value, handle.at):
+                    break
+        return left
+
+    @staticmethod
+    def _skip_unavailable(steps, rec):
+        for name, deliver, _, _ in steps:
+            if deliver is None:
+                rec['fallback'].append(f"{name} unavailable")
+
+    def _deliver_slow(self, handle, jobs, return_focus_to):
+        try:
+            for prog, value, chain, rec in jobs:
+                for name, deliver, _, _ in chain:
+                    if deliver is None:
+                        rec['fallback'].append(f"{name} unavailable")
+                    elif self._attempt(handle, [rec], name, deliver, prog, value, handle.at):
+                        break
+            if return_focus_to and jobs:
+                hwnd = _find_window_partial(return_focus_to)
+                if hwnd is not None:
+                    _ensure_focus(hwnd)
+        finally:
+            handle._done.set()
+            if self._fast_lane is not None:
+                with self._lock:
+                    self._inflight -= 1
+
+    # ---- delivery log ---------------------------------------------------- #
+    def latency_summary(self):
+        """Per resolved transport: delivered / failed counts and request ->
+        delivery-end latency percentiles (ms)."""
+        by_transport = {}
+        for handle in self.log:
+            for rec in handle.records:
+                entry = by_transport.setdefault(rec['transport'], {'delivered': [], 'failed': 0})
+                if rec['ok']:
+                    entry['delivered'].append(rec['end'] - handle.requested)
+                else:
+                    entry['failed'] += 1
+        return {t: {'n': len(e['delivered']), 'failed': e['failed'],
+                    'p50_ms': _pct_ms(e['delivered'], 0.5),
+                    'p95_ms': _pct_ms(e['delivered'], 0.95),
+                    'max_ms': _pct_ms(e['delivered'], 1.0)}
+                for t, e in by_transport.items()}
+
+    def write_log(self, path):
+        """One CSV row per program per send; times in ms from the request."""
+        def ms(t, handle):
+            return round((t - handle.requested) * 1000, 3) if t is not None else ''
+        try:
+            with open(path, 'w', newline='') as f:
+                out = csv.writer(f)
+                out.writerow(['Send', 'Label', 'Value', 'Window', 'Route', 'Transport', 'Ok',
+                              'RequestedS', 'EventS', 'StartMs', 'EndMs', 'Stamp', 'Fallback'])
+                for i, handle in enumerate(self.log):
+                    for rec in handle.records:
+                        out.writerow([i, handle.label or '', handle.value, rec['window'],
+                                      rec['route'], rec['transport'], int(rec['ok']),
+                                      round(handle.requested, 6), round(handle.at, 6),
+                                      ms(rec['start'], handle),
+                                      ms(rec['end'], handle),
+                                      rec['stamp'] if rec['stamp'] is not None else '',
+                                      '; '.join(rec['fallback'])])
             return True
         except Exception as e:
-            print(f"TriggerManager: keystroke to {window} failed ({e})")
+            print(f"TriggerManager: could not write trigger log {path} ({e})")
             return False
 
     # ---- introspection (for the future UI indicators) ------------------- #
-    def _resolved_transport(self, prog):
-        """What this program will actually use given current availability."""
-        t = prog.get('transport', 'keystroke').lower()
-        if t == 'ttl' and self._ttl_dev is None:
-            t = 'lsl'
-        if t == 'lsl' and self._lsl_out is None:
-            t = 'keystroke'
-        return t
-
     def status(self):
-        resolved = sorted({self._resolved_transport(p) for p in self.programs})
+        if self._availability() != self._avail:
+            self._compile()
+        # What each program will actually use given current availability
+        programs = [(window, next((name for name, deliver, _, _ in chain if deliver), 'none'))
+                    for _, window, _, _, chain in self._plan]
+        resolved = sorted({t for _, t in programs})
         return {
-            'ttl_available':  self._ttl_dev is not None,
-            'lsl_available':  self._lsl_out is not None,
+            'ttl_available':  self.transports['ttl'].available,
+            'lsl_available':  self.transports['lsl'].available,
             'active_method':  '+'.join(resolved) if resolved else 'none',
-            'programs':       [(p.get('window'), self._resolved_transport(p))
-                               for p in self.programs],
+            'programs':       programs,
         }
 
     # ---- cleanup -------------------------------------------------------- #
-    def close(self):
-        if self._ttl_dev is not None:
-            try:
-                self._ttl_dev.con.close()
-            except Exception as e:
-                print(f"TriggerManager: error closing TTL ({e})")
-            self._ttl_dev = None
-        if self._lsl_out is not None:
-            try:
-                del self._lsl_out
-            except Exception as e:
-                print(f"TriggerManager: error closing LSL ({e})")
-            self._lsl_out = None
-        self._method = 'none'
+    def close(self, log_path=None):
+        """Drain pending deliveries, report latency and write the delivery
+        log to `log_path` (if given), then release the devices."""
+        if self._fast_lane is not None:
+            # Let queued triggers go out before the devices are closed
+            self._fast_lane.shutdown(wait=True)
+            self._key_lane.shutdown(wait=True)
+            self._fast_lane = self._key_lane = None
+        if self.log:
+            for transport, st in self.latency_summary().items():
+                latency = (f", latency p50/p95/max {st['p50_ms']:.2f}/{st['p95_ms']:.2f}/"
+                           f"{st['max_ms']:.2f} ms" if st['n'] else "")
+                print(f"TriggerManager: {transport}: {st['n']} delivered, "
+                      f"{st['failed']} failed{latency}")
+            if log_path:
+                self.write_log(log_path)
+            self.log = []
+            if windows.scans:
+                print(f"WindowResolver: {windows.stats()}")
+        for transport in self.transports.values():
+            transport.close()
 
     def __del__(self):
         self.close()
@@ -272,7 +859,9 @@ def resolve_display(requested_index, requested_width, requested_height):
 
 def ensure_window_focus(window_handle, max_attempts=20, delay_ms=50):
     """Attempt to set window focus with multiple retries"""
-    pyautogui.press("alt")
+    if not _WIN32_AVAILABLE or window_handle is None:
+        return False
+    _tap_alt()
     for attempt in range(max_attempts):
         try:
             win32gui.SetForegroundWindow(window_handle)
@@ -284,116 +873,1419 @@ def ensure_window_focus(window_handle, max_attempts=20, delay_ms=50):
     print(f"Failed to focus window after {max_attempts} attempts")
     return False
 
+# ---- Focus watchdog -------------------------------------------------------- #
+class NullFocusBackend:
+    """Stand-in for non-Windows hosts / headless runs: never moves focus."""
+    def request_focus(self):
+        return False
+
+
+class Win32FocusBackend:
+    """Brings the paradigm window (exact title) to the foreground with a single
+    non-blocking attempt; the watchdog decides when to try again."""
+    def __init__(self, window_name):
+        self.window_name = window_name
+        self._hwnd       = None
+
+    def request_focus(self):
+        self._hwnd = windows.find(self.window_name, exact=True)
+        if self._hwnd is None:
+            return False
+        try:
+            _tap_alt()
+            win32gui.SetForegroundWindow(self._hwnd)
+            return True
+        except Exception:
+            windows.invalidate(self.window_name)
+            return False
+
+
+class FocusWatchdog:
+    """Tracks input focus from pygame window events and re-asserts it only
+    after a real loss, one attempt per `retry_ms`, so the frame loop never
+    blocks on it. Counts losses and time spent without focus; the paradigm
+    resets those per block.
+
+    `hold` is an optional callable; while it returns True focus is expected
+    to be elsewhere (e.g. keystroke triggers in flight) and is not taken back.
+    """
+    def __init__(self, backend=None, retry_ms=250, hold=None):
+        self.backend   = backend or NullFocusBackend()
+        self.retry_ms  = retry_ms
+        self.hold      = hold
+        self.has_focus = True
+        self._lost_at      = None
+        self._last_attempt = None
+        self.reset_block()
+
+    def attach_window(self, window_name):
+        """Use the Win32 backend for `window_name` where available."""
+        self.backend   = Win32FocusBackend(window_name) if _WIN32_AVAILABLE else NullFocusBackend()
+        # The dummy video driver never reports focus; treat it as always focused
+        headless = not pygame.display.get_init() or pygame.display.get_driver() == 'dummy'
+        self.has_focus = True if headless else pygame.key.get_focused()
+        self._lost_at  = None if self.has_focus else now()
+
+    def reset_block(self):
+        """Start a new block's counts. A loss still in progress carries over:
+        it counts as one loss of the new block, timed from now."""
+        self.losses   = 0
+        self.lost_s   = 0.0
+        self.attempts = 0
+        if self._lost_at is not None:
+            self._lost_at = now()
+            self.losses   = 1
+
+    # ---- event tracking -------------------------------------------------- #
+    def handle_event(self, event):
+        if event.type == getattr(pygame, 'WINDOWFOCUSLOST', None):
+            self._set_focus(False)
+        elif event.type == getattr(pygame, 'WINDOWFOCUSGAINED', None):
+            self._set_focus(True)
+        elif event.type == pygame.ACTIVEEVENT and event.state & pygame.APPINPUTFOCUS:
+            self._set_focus(bool(event.gain))
+
+    def _set_focus(self, focused):
+        if focused == self.has_focus:
+            return
+        self.has_focus = focused
+        if focused:
+            self.lost_s  += now() - self._lost_at
+            self._lost_at = None
+        else:
+            self.losses  += 1
+            self._lost_at = now()
+            self._last_attempt = None
+
+    def poll(self):
+        """Call once per frame: re-asserts focus if it was lost (rate-limited)."""
+        if self.has_focus or (self.hold is not None and self.hold()):
+            return
+        t = now()
+        if self._last_attempt is None or (t - self._last_attempt) * 1000 >= self.retry_ms:
+            self._last_attempt = t
+            self.attempts += 1
+            self.backend.request_focus()
+
+    def stats(self):
+        """(losses, seconds without focus) so far in this block, counting an
+        ongoing loss up to now."""
+        lost = self.lost_s + (now() - self._lost_at if self._lost_at is not None else 0.0)
+        return self.losses, lost
+
+
+# Shared instance; check_for_quit / wait_for_event feed it window events
+focus = FocusWatchdog()
+
+
+class ProgressChannel:
+    """
+    Carries progress records to the control panel off the frame loop.
+    post() only swaps in the newest record and wakes the sender thread, so
+    bursts of updates coalesce into whatever the channel can carry. The
+    target is tcp://host:port (one JSON line per record, to the panel's
+    listener) or a file path, rewritten atomically via a temp file and
+    os.replace so the reader never sees a half-written record.
+    """
+    def __init__(self, target):
+        self.target  = target
+        self.sent    = 0
+        self.dropped = 0            # records superseded before they were sent
+        self._latest = None
+        self._socket = None
+        self._failed = False
+        self._wake   = threading.Event()
+        self._idle   = threading.Event()
+        self._idle.set()
+        self._lock   = threading.Lock()
+        threading.Thread(target=self._run, name='progress', daemon=True).start()
+
+    def post(self, record):
+        with self._lock:
+            if self._latest is not None:
+                self.dropped += 1
+            self._latest = record
+            self._idle.clear()
+        self._wake.set()
+
+    def flush(self, timeout=1.0):
+        """Wait (bounded) until the newest record has gone out."""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                record, self._latest = self._latest, None
+            if record is not None:
+                self._write(json.dumps(record))
+                self.sent += 1
+            with self._lock:
+                if self._latest is None:
+                    self._idle.set()
+
+    def _write(self, line):
+        if self.target.startswith('tcp://'):
+            if self._failed:
+                return
+            try:
+                if self._socket is None:
+                    import socket
+                    host, port = self.target[len('tcp://'):].rsplit(':', 1)
+                    self._socket = socket.create_connection((host, int(port)), timeout=2.0)
+                self._socket.sendall((line + '\n').encode('utf-8'))
+            except OSError as e:
+                # Panel gone: drop progress for the rest of the run, never retry
+                # from inside a session
+                print(f"ProgressChannel: {self.target} unreachable ({e}); progress disabled")
+                self._failed = True
+            return
+        tmp = self.target + '.tmp'
+        for _ in range(3):
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(line)
+                os.replace(tmp, self.target)
+                return
+            except OSError:
+                time.sleep(0.02)    # Windows: the reader has the file open
+        print(f"ProgressChannel: could not update {self.target}")
+
+
+_progress_channels = {}
+
+def _flush_progress():
+    for channel in _progress_channels.values():
+        channel.flush()
+
+atexit.register(_flush_progress)
+
 def update_progress(progress_file, progress, status):
-    """Update progress file with current progress and status"""
+    """Post progress and status to the control panel; `progress_file` is a
+    file path or tcp://host:port (see ProgressChannel). Never blocks."""
     if not progress_file:
         return
-    try:
-        with open(progress_file, 'w') as f:
-            json.dump({
-                "progress": progress,
-                "status": status
-            }, f)
-    except Exception as e:
-        print(f"Error updating progress: {e}")
-        pass
+    channel = _progress_channels.get(progress_file)
+    if channel is None:
+        channel = _progress_channels[progress_file] = ProgressChannel(progress_file)
+    channel.post({
+        "progress": progress,
+        "status": status,
+        "time": round(now(), 6)     # session clock, see ClockSync
+    })
 
 def find_window_with_partial_name(partial_name):
     """Find window by partial title"""
-    def enum_windows_callback(hwnd, results):
-        window_text = win32gui.GetWindowText(hwnd)
-        if partial_name in window_text:
-            results.append((hwnd, window_text))
+    return windows.find(partial_name)
+
+def check_window_resolver():
+    """Drive the window lookups against a StandInWindowBackend: cached hits,
+    remembered misses, a closed window and invalidate(). Returns (ok, stats);
+    the previously installed backend is restored afterwards."""
+    previous = windows.backend
+    desk     = StandInWindowBackend()
+    windows.set_backend(desk)
+    checks   = {}
+    try:
+        aurora   = desk.add('Aurora fNIRS - Recording')
+        recorder = desk.add('g.Recorder')
+        checks['partial']       = find_window_with_partial_name('Aurora') == aurora
+        scans = windows.scans
+        checks['cached hit']    = (_find_window_partial('Aurora') == aurora
+                                   and windows.scans == scans)
+        checks['exact']         = (find_window('g.Recorder') == recorder
+                                   and find_window('g.Rec') is None)
+        scans = windows.scans
+        hits  = windows.hits
+        checks['miss cached']   = (find_window_with_partial_name('LabChart') is None
+                                   and find_window_with_partial_name('LabChart') is None
+                                   and windows.scans == scans + 1
+                                   and windows.hits == hits and windows.negative_hits == 1)
+        desk.close(aurora)
+        checks['closed']        = find_window_with_partial_name('Aurora') is None
+        reopened = desk.add('Aurora fNIRS - Recording')
+        checks['miss until invalidate'] = find_window_with_partial_name('Aurora') is None
+        windows.invalidate('Aurora')
+        checks['invalidate']    = find_window_with_partial_name('Aurora') == reopened
+        stats = windows.stats()
+        checks['stale counted'] = stats['stale'] == 1
+    finally:
+        windows.set_backend(previous)
+    for name, passed in checks.items():
+        if not passed:
+            print(f"check_window_resolver: {name} FAILED")
+    return all(checks.values()), stats
+
+def _is_quit_event(event):
+    """Window close, Ctrl+C (both windows and mac) or Escape."""
+    if event.type == pygame.QUIT:
         return True
-   
-    results = []
-    win32gui.EnumWindows(enum_windows_callback, results)
-    return results[0][0] if results else None
+    if event.type == pygame.KEYDOWN:
+        if event.key == pygame.K_c and (pygame.key.get_mods() & pygame.KMOD_CTRL):
+            return True
+        if event.key == pygame.K_ESCAPE:
+            return True
+    return False
 
 def check_for_quit():
     """Check if user is attempting to quit the application"""
+    if frames.enabled:
+        frames.pumped(time.perf_counter())
     for event in pygame.event.get():
-        if event.type == pygame.QUIT:
+        if _is_quit_event(event):
             pygame.quit()
             return True
-        if event.type == pygame.KEYDOWN:
-            # Check if ctrl+c is pressed (both windows and mac)
-            if event.key == pygame.K_c and (pygame.key.get_mods() & pygame.KMOD_CTRL):
-                pygame.quit()
-                return True
-            # Also exit on Escape key
-            if event.key == pygame.K_ESCAPE:
-                pygame.quit()
-                return True
+        focus.handle_event(event)
     return False
 
-def display_message(screen, font, message, wait=0, custom_font_size=None, progress_file=None, 
-                   status=None, progress_start=None, progress_end=None, image_path=None, 
-                   position=None, width_screen=1920, height_screen=1080):
-    bg_color = (0, 0, 0)
+_EXPOSE_EVENTS = {getattr(pygame, name) for name in ('VIDEOEXPOSE', 'WINDOWEXPOSED')
+                  if hasattr(pygame, name)}
+
+def wait_for_event(keys=(), timeout_ms=None):
+    """
+    Sleep in pygame.event.wait until one of `keys` is pressed, the user quits
+    or `timeout_ms` elapses (None = no timeout). Uses no CPU while idle, unlike
+    polling check_for_quit() in a loop. Quit semantics match check_for_quit:
+    window close, Ctrl+C or Esc shut pygame down.
+
+    Returns:
+        str: 'quit', 'key' or 'timeout'
+    """
+    deadline = None if timeout_ms is None else now() + timeout_ms / 1000
+    while True:
+        pumped = time.perf_counter() if frames.enabled else None
+        if deadline is None:
+            event = _clock.wait_event(keys=keys)
+        else:
+            remaining = (deadline - now()) * 1000
+            if remaining <= 0:
+                return 'timeout'
+            event = _clock.wait_event(max(1, int(remaining)))
+        if pumped is not None:
+            frames.pumped(pumped)
+        if event.type == pygame.NOEVENT:
+            continue
+        if _is_quit_event(event):
+            pygame.quit()
+            return 'quit'
+        if event.type == pygame.KEYDOWN and event.key in keys:
+            return 'key'
+        focus.handle_event(event)
+        if event.type in _EXPOSE_EVENTS and _scene is not None:
+            # Window was uncovered: nothing else is redrawing while we sleep
+            _scene.invalidate()
+            _scene.present()
+
+def _event_time(event, pumped_at):
+    """now()-clock time of `event`: the SDL event timestamp where the pygame
+    build exposes one (ms on the SDL tick clock), else the time it was pumped."""
+    sdl_ms = getattr(event, 'timestamp', None)
+    if sdl_ms is None or _clock.virtual:
+        return pumped_at
+    return pumped_at - max(0, pygame.time.get_ticks() - sdl_ms) / 1000
+
+def pump_events(timeout_ms=0):
+    """
+    Drain the event queue, first sleeping up to `timeout_ms` for an event to
+    arrive. Because the sleep is in pygame.event.wait, an input event ends it
+    immediately and is stamped on arrival instead of after a fixed frame sleep.
+
+    Returns:
+        list: [(timestamp, event), ...] with timestamps on the now() clock
+    """
+    pumped = time.perf_counter() if frames.enabled else None
+    stamped = []
+    if timeout_ms > 0:
+        event = _clock.wait_event(max(1, int(timeout_ms)))
+        if event.type != pygame.NOEVENT:
+            stamped.append((_event_time(event, now()), event))
+    for event in pygame.event.get():
+        stamped.append((_event_time(event, now()), event))
+    if pumped is not None:
+        frames.pumped(pumped)
+    return stamped
+
+# ---- Input capture --------------------------------------------------------- #
+class InputRing:
+    """Preallocated single-producer / single-consumer ring of input records
+    (timestamp, event type, key, mod). The producer only advances `_head`, the
+    consumer only `_tail`, so no lock is needed. A full ring drops the new
+    record and counts it in `overflows` rather than blocking the producer.
+    """
+    def __init__(self, capacity=256):
+        self.capacity  = capacity
+        self.overflows = 0
+        self.pushed    = 0
+        self.max_depth = 0
+        self._slots    = [(0.0, 0, 0, 0)] * capacity
+        self._head     = 0
+        self._tail     = 0
+
+    def push(self, stamp, etype, key=0, mod=0):
+        depth = self._head - self._tail
+        if depth >= self.capacity:
+            self.overflows += 1
+            return False
+        self._slots[self._head % self.capacity] = (stamp, etype, key, mod)
+        self._head += 1             # publish only after the slot is written
+        self.pushed += 1
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
+        return True
+
+    def drain(self):
+        head, out = self._head, []
+        while self._tail < head:
+            out.append(self._slots[self._tail % self.capacity])
+            self._tail += 1
+        return out
+
+
+class InputCapture:
+    """
+    Input path for the timed loops. configure() restricts the SDL queue to the
+    events the paradigms act on (pygame.event.set_allowed), pump() stamps and
+    pushes key/quit events into an InputRing and routes window events to the
+    focus watchdog, and trial logic reads them back with drain().
+
+    SDL only pumps window events on the thread that owns the window, so pump()
+    runs on the main thread; it is what the frame loop sleeps in, so input is
+    picked up as it arrives between (rare) display updates.
+    """
+    def __init__(self, capacity=256):
+        self.ring = InputRing(capacity)
+
+    @staticmethod
+    def configure():
+        allowed = [pygame.QUIT, pygame.KEYDOWN, pygame.ACTIVEEVENT, pygame.VIDEOEXPOSE]
+        allowed += [getattr(pygame, name) for name in
+                    ('WINDOWFOCUSLOST', 'WINDOWFOCUSGAINED', 'WINDOWEXPOSED', 'WINDOWCLOSE')
+                    if hasattr(pygame, name)]
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(allowed)
+
+    def pump(self, timeout_ms=0):
+        """Sleep up to `timeout_ms` for input, then move everything queued into
+        the ring. Returns the number of records pushed."""
+        pushed = 0
+        for stamp, event in pump_events(timeout_ms):
+            if event.type in (pygame.QUIT, pygame.KEYDOWN):
+                mod = getattr(event, 'mod', 0) | (pygame.key.get_mods() if event.type == pygame.KEYDOWN else 0)
+                pushed += self.ring.push(stamp, event.type, getattr(event, 'key', 0), mod)
+            elif event.type in _EXPOSE_EVENTS and _scene is not None:
+                _scene.invalidate()
+            else:
+                focus.handle_event(event)
+        return pushed
+
+    def drain(self):
+        return self.ring.drain()
+
+    def stats(self):
+        return {'pushed': self.ring.pushed, 'overflows': self.ring.overflows,
+                'max_depth': self.ring.max_depth}
+
+
+# Shared instance for the paradigm frame loops
+capture = InputCapture()
+
+
+CALIBRATION_P95_MS = 2.0      # pass/fail bound for calibrate_response_capture
+
+def calibrate_response_capture(n_events=50, interval_ms=37, max_p95_ms=CALIBRATION_P95_MS):
+    """
+    Measure pump_events() timestamp error with synthetic key events posted
+    from a helper thread at known now() times. Needs an initialized display
+    (SDL's dummy driver is fine). Returns error stats in milliseconds plus
+    missed / duplicated event counts; 'ok' is True when nothing was missed
+    or duplicated and the p95 error is within `max_p95_ms`.
+    """
+    posted = {}
+    def _inject():
+        for seq in range(n_events):
+            time.sleep(interval_ms / 1000)
+            posted[seq] = now()
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE, mod=0, seq=seq))
+    pygame.event.clear()
+    injector = threading.Thread(target=_inject, daemon=True)
+    injector.start()
+    captured = []       # (seq, timestamp)
+    deadline = now() + n_events * interval_ms / 1000 + 1.0
+    while len(captured) < n_events and now() < deadline:
+        captured += [(getattr(e, 'seq', None), t) for t, e in pump_events(interval_ms)
+                     if e.type == pygame.KEYDOWN]
+    injector.join()
+    captured += [(getattr(e, 'seq', None), t) for t, e in pump_events(interval_ms)
+                 if e.type == pygame.KEYDOWN]     # anything arriving twice
+    seen = {}
+    for seq, t in captured:
+        seen.setdefault(seq, []).append(t)
+    missed     = sum(seq not in seen for seq in posted)
+    duplicated = sum(len(ts) - 1 for ts in seen.values()) + sum(seq not in posted for seq in seen)
+    errors = sorted((ts[0] - posted[seq]) * 1000 for seq, ts in seen.items() if seq in posted)
+    result = {'n': len(errors), 'missed': missed, 'duplicated': duplicated,
+              'max_p95_ms': max_p95_ms}
+    if errors:
+        result.update(mean_ms=sum(errors) / len(errors),
+                      p95_ms=errors[int(0.95 * (len(errors) - 1))], max_ms=errors[-1])
+    result['ok'] = (bool(errors) and not missed and not duplicated
+                    and result['p95_ms'] <= max_p95_ms)
+    return result
+
+# ---- Session clock -------------------------------------------------------- #
+class RealClock:
+    """Wall-clock time; waits sleep in pygame.event.wait."""
+    virtual = False
+
+    def now(self):
+        return time.perf_counter()
+
+    def wait_event(self, timeout_ms=None, keys=()):
+        if timeout_ms is None:
+            return pygame.event.wait()
+        return pygame.event.wait(max(1, int(timeout_ms)))
+
+
+class VirtualClock:
+    """
+    Simulated time for headless runs. A wait with nothing queued returns at
+    once and advances the clock by its timeout, so a session goes through the
+    same scheduling code in a fraction of its length. A wait without timeout
+    (waiting rooms, end screen) stands in for the operator: after
+    `operator_ms` it presses the first awaited key, or closes the window if
+    no key is awaited.
+    """
+    virtual = True
+
+    def __init__(self, operator_ms=1000):
+        self.t           = 0.0
+        self.operator_ms = operator_ms
+
+    def now(self):
+        return self.t
+
+    def advance(self, seconds):
+        self.t += max(0.0, seconds)
+
+    def wait_event(self, timeout_ms=None, keys=()):
+        event = pygame.event.poll()
+        if event.type != pygame.NOEVENT:
+            return event
+        if timeout_ms is not None:
+            self.advance(timeout_ms / 1000)
+            return event
+        self.advance(self.operator_ms / 1000)
+        if keys:
+            return pygame.event.Event(pygame.KEYDOWN, key=keys[0], mod=0)
+        return pygame.event.Event(pygame.QUIT)
+
+
+_clock = RealClock()
+
+def set_clock(clock):
+    """Swap the clock every wait and timestamp goes through."""
+    global _clock
+    _clock = clock
+    return clock
+
+def get_clock():
+    return _clock
+
+def use_headless(virtual_clock=False):
+    """
+    Run on SDL's dummy video/audio drivers with the Win32 calls (focus,
+    keystroke triggers, window lookup) stubbed out. Call before pygame.init();
+    an already-initialized pygame (warm worker) is shut down so the next init
+    picks up the dummy drivers. With `virtual_clock`, waits advance a
+    VirtualClock instead of sleeping.
+    """
+    global _WIN32_AVAILABLE
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    if pygame.display.get_init():
+        pygame.quit()
+    _WIN32_AVAILABLE = False
+    windows.set_backend(StandInWindowBackend())
+    if virtual_clock:
+        set_clock(VirtualClock())
+    print(f"Headless mode ({'virtual' if virtual_clock else 'real'} clock)")
+
+def now():
+    """High-resolution monotonic timestamp in seconds. All flip and response
+    timestamps are taken on this clock so they can be subtracted directly."""
+    return _clock.now()
+
+
+# ---- Clock reconciliation ------------------------------------------------- #
+class ClockSync:
+    """
+    Offsets and drift of the other clocks a session touches (pygame ticks,
+    the LSL clock, the XID base timer) against now(), the session's single
+    reference. sample() reads each registered source between two now() reads
+    and keeps the tightest of `tries` brackets: offset = source - midpoint,
+    uncertainty = half the bracket. Drift is the least-squares slope of the
+    offsets over the session. write() saves the table with the results, so
+    behavioral timestamps can be mapped onto fNIRS/EEG recordings.
+    """
+    def __init__(self, tries=5):
+        self.tries   = tries
+        self.sources = {}       # name -> callable returning seconds
+        self.samples = []       # (name, reference time, offset, uncertainty, label)
+
+    def add_source(self, name, read_s):
+        self.sources[name] = read_s
+
+    def sample(self, label=''):
+        """Take one offset sample per source. Call between timed phases
+        (some sources, e.g. the XID timer, are slow to read)."""
+        if _clock.virtual:
+            return      # simulated time has no relation to the other clocks
+        for name, read_s in list(self.sources.items()):
+            best = None
+            for _ in range(self.tries):
+                try:
+                    t0 = now()
+                    value = read_s()
+                    t1 = now()
+                except Exception as e:
+                    print(f"ClockSync: could not read {name} ({e})")
+                    break
+                if value is None:
+                    break
+                if best is None or t1 - t0 < best[1] - best[0]:
+                    best = (t0, t1, value)
+            if best is not None:
+                t0, t1, value = best
+                mid = (t0 + t1) / 2
+                self.samples.append((name, mid, value - mid, (t1 - t0) / 2, label))
+
+    def fit(self, name):
+        """(offset at reference 0, drift in s/s) for `name`, or None."""
+        points = [(t, off) for n, t, off, _, _ in self.samples if n == name]
+        if not points:
+            return None
+        if len(points) < 2:
+            return points[0][1], 0.0
+        mt = sum(t for t, _ in points) / len(points)
+        mo = sum(o for _, o in points) / len(points)
+        var = sum((t - mt) ** 2 for t, _ in points)
+        drift = sum((t - mt) * (o - mo) for t, o in points) / var if var else 0.0
+        return mo - drift * mt, drift
+
+    def to_source(self, name, t):
+        """Map a now()-clock time onto clock `name` (None if never sampled)."""
+        fit = self.fit(name)
+        if fit is None:
+            return None
+        return t + fit[0] + fit[1] * t
+
+    def summary(self):
+        out = {}
+        for name in self.sources:
+            fit = self.fit(name)
+            if fit is not None:
+                out[name] = {'offset_s': fit[0], 'drift_ppm': fit[1] * 1e6,
+                             'samples': sum(1 for s in self.samples if s[0] == name)}
+        return out
+
+    def write(self, path):
+        """Samples as CSV (Source, Label, RefS, OffsetS, UncertaintyUs) plus a
+        'fit' row per source with the drift in ppm."""
+        if not self.samples:
+            return False
+        try:
+            with open(path, 'w', newline='') as f:
+                out = csv.writer(f)
+                out.writerow(['Source', 'Label', 'RefS', 'OffsetS', 'UncertaintyUs', 'DriftPpm'])
+                for name, t, offset, err, label in self.samples:
+                    out.writerow([name, label, f"{t:.6f}", f"{offset:.9f}", f"{err * 1e6:.1f}", ''])
+                for name, st in self.summary().items():
+                    out.writerow([name, 'fit', '0', f"{st['offset_s']:.9f}", '',
+                                  f"{st['drift_ppm']:.3f}"])
+            for name, st in self.summary().items():
+                print(f"ClockSync: {name} drift {st['drift_ppm']:+.2f} ppm "
+                      f"over {st['samples']} samples")
+            return True
+        except Exception as e:
+            print(f"ClockSync: could not write {path} ({e})")
+            return False
+
+
+# Shared instance; sources register themselves as they come up
+clock_sync = ClockSync()
+clock_sync.add_source('pygame_ticks',
+                      lambda: pygame.time.get_ticks() / 1000 if pygame.display.get_init() else None)
+
+
+# ---- Startup profile ------------------------------------------------------ #
+# Process start to first visible frame, per launch. Budget documented in the
+# README; `python auxfunc/paradigm_utils.py --startup_budget <paradigm>` checks it.
+STARTUP_BUDGET_MS = 1500
+
+def _process_age_s():
+    """Seconds since this process was created, or None if the OS won't say."""
+    try:
+        if os.name == 'nt':
+            import ctypes
+            from ctypes import wintypes
+            creation, exit_, kernel, user, current = (wintypes.FILETIME() for _ in range(5))
+            k32 = ctypes.windll.kernel32
+            if not k32.GetProcessTimes(k32.GetCurrentProcess(), ctypes.byref(creation),
+                                       ctypes.byref(exit_), ctypes.byref(kernel), ctypes.byref(user)):
+                return None
+            k32.GetSystemTimePreciseAsFileTime(ctypes.byref(current))
+            ticks = lambda ft: (ft.dwHighDateTime << 32) | ft.dwLowDateTime   # 100 ns units
+            return (ticks(current) - ticks(creation)) / 1e7
+        with open('/proc/self/stat') as f:
+            started = int(f.read().rsplit(')', 1)[1].split()[19])   # field 22, clock ticks
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - started / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
+
+
+class StartupProfile:
+    """
+    Named marks in ms from process start (from the OS where it tells us,
+    else from when this module was imported) on the perf_counter clock, so
+    they stay real under the virtual clock. Each label is kept the first
+    time only; Scene marks 'first frame' itself. restart() re-zeroes it,
+    e.g. in a pre-warmed worker when the session is handed over.
+
+    `imports` holds how long each heavy module took to import in this launch
+    (pygame, and whatever goes through import_module(): pandas, pylsl,
+    pyxid2); a module already loaded, e.g. by the warm worker, shows ~0.
+    """
+    def __init__(self):
+        age = _process_age_s()
+        self.t0      = time.perf_counter() - (age if age is not None else 0.0)
+        self.origin  = 'process start' if age is not None else 'paradigm_utils import'
+        self.marks   = OrderedDict()
+        self.imports = OrderedDict()
+
+    def restart(self, origin='session request'):
+        self.t0      = time.perf_counter()
+        self.origin  = origin
+        self.marks   = OrderedDict()
+        self.imports = OrderedDict()
+
+    def mark(self, label):
+        if label not in self.marks:
+            self.marks[label] = (time.perf_counter() - self.t0) * 1000
+
+    def import_module(self, name):
+        """importlib.import_module(name), timed into `imports` the first time;
+        ImportError propagates."""
+        start  = time.perf_counter()
+        module = importlib.import_module(name)
+        if name not in self.imports:
+            self.imports[name] = (time.perf_counter() - start) * 1000
+        return module
+
+    def report(self):
+        steps, last = [], 0.0
+        for label, ms in self.marks.items():
+            steps.append(f"{label} {ms:.0f} ms (+{ms - last:.0f})")
+            last = ms
+        first = self.marks.get('first frame')
+        verdict = (f"; first frame {'within' if first <= STARTUP_BUDGET_MS else 'OVER'} "
+                   f"the {STARTUP_BUDGET_MS} ms budget" if first is not None else "")
+        print(f"Startup (from {self.origin}): " + ", ".join(steps) + verdict)
+        if self.imports:
+            print("Startup imports: " + ", ".join(f"{name} {ms:.0f} ms"
+                                                  for name, ms in self.imports.items()))
+
+    def write(self, path):
+        try:
+            with open(path, 'w', newline='') as f:
+                out = csv.writer(f)
+                out.writerow(['Mark', 'Ms', 'Origin'])
+                for label, ms in self.marks.items():
+                    out.writerow([label, f"{ms:.1f}", self.origin])
+                for name, ms in self.imports.items():
+                    out.writerow([f"import {name}", f"{ms:.1f}", 'import duration'])
+            return True
+        except Exception as e:
+            print(f"StartupProfile: could not write {path} ({e})")
+            return False
+
+
+# Shared instance; pygame (the heaviest import here) is loaded by now
+startup = StartupProfile()
+startup.imports['pygame'] = _pygame_import_ms
+startup.mark('paradigm_utils imported')
+
+
+def init_pygame(audio=True):
+    """
+    Bring up only the pygame subsystems a paradigm uses (display, font, the
+    SDL timer behind get_ticks and, if `audio`, the mixer) instead of
+    pygame.init()'s everything (joystick, camera, ...).
+    """
+    pygame.display.init()
+    pygame.font.init()
+    pygame.time.delay(1)        # starts SDL's timer; get_ticks() reads 0 until then
+    if audio and not pygame.mixer.get_init():
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            print(f"init_pygame: no audio ({e})")
+    startup.mark('pygame init')
+
+
+# ---- Glyph cache ---------------------------------------------------------- #
+class GlyphCache:
+    """Pre-rendered text surfaces keyed by (text, size, color, antialias).
+
+    Frame loops only blit from here: build a block's glyphs up front with
+    preload(), after which get() is a dict lookup. Bounded by LRU eviction.
+    `misses` counts rasterizations done by get() (preload() does not count),
+    so a block that was fully preloaded should not move it.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+        self._fonts      = {}
+        self._surfaces   = OrderedDict()
+
+    def _font(self, size):
+        font = self._fonts.get(size)
+        if font is None:
+            font = pygame.font.SysFont(None, size)
+            self._fonts[size] = font
+        return font
+
+    def _render(self, key):
+        text, size, color, antialias = key
+        surf = self._font(size).render(text, antialias, color)
+        if pygame.display.get_surface() is not None:
+            surf = surf.convert_alpha()     # match the display pixel format
+        self._surfaces[key] = surf
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surf
+
+    def get(self, text, size=300, color=(255, 255, 255), antialias=True):
+        key  = (str(text), size, tuple(color), antialias)
+        surf = self._surfaces.get(key)
+        if surf is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        return self._render(key)
+
+    def preload(self, texts, size=300, color=(255, 255, 255), antialias=True):
+        """Rasterize `texts` ahead of time without touching hit/miss counters."""
+        for text in texts:
+            key = (str(text), size, tuple(color), antialias)
+            if key in self._surfaces:
+                self._surfaces.move_to_end(key)
+            else:
+                self._render(key)
+
+    def stats(self):
+        return {'entries': len(self._surfaces), 'hits': self.hits,
+                'misses': self.misses}
+
+
+# Shared instance for the paradigm frame loops
+glyphs = GlyphCache()
+
+# ---- Frame timing --------------------------------------------------------- #
+def _pct_ms(values, q):
+    """Nearest-rank percentile of `values` (seconds), in ms; 0 if empty."""
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] * 1000 if values else 0.0
+
+
+class FrameTimer:
+    """
+    Optional frame-pacing record, filled in by Scene.present(). Per frame it
+    stores the repaint start, render and flip durations and the interval since
+    the previous flip in a preallocated array, plus the `phase` label the
+    paradigm set (what was running). Disabled, it costs present() one
+    attribute check.
+
+    The input pumps report in through pumped(): the gap between one pump
+    ending and the next starting is loop work during which input went unread
+    (render, flip, triggers, logging, loading...). Gaps over the budget are
+    kept with the phase they ended in.
+
+    block_summary() reports the frames and gaps since its last call; write()
+    and write_gaps() dump the whole session as CSV.
+    """
+    FIELDS = 4      # start, render, flip, interval (seconds)
+
+    def __init__(self):
+        self.enabled = False
+        self.phase   = 'startup'
+        self.n       = 0
+
+    def enable(self, capacity=20000, budget_ms=1000 / 60):
+        self.capacity   = capacity
+        self.budget_ms  = budget_ms
+        self.dropped    = 0
+        self.n          = 0
+        self._data      = array('d', bytes(8 * self.FIELDS * capacity))
+        self._phase_idx = array('H', bytes(2 * capacity))
+        self._labels    = []
+        self._label_idx = {}
+        self._block     = 0
+        self._last_flip = None
+        self._last_pump = None
+        self.gaps       = []        # (start, gap s, phase) over budget
+        self._gap_block = 0
+        self._gap_max   = 0.0
+        self._gap_phase = None
+        self.enabled    = True
+
+    def record(self, start, render_s, flip_s, flipped):
+        """`start`/`flipped` are session-clock times; the durations are always
+        real (perf_counter), so they stay meaningful under a VirtualClock."""
+        i = self.n
+        interval = flipped - self._last_flip if self._last_flip is not None else 0.0
+        self._last_flip = flipped
+        if i >= self.capacity:
+            self.dropped += 1
+            return
+        label = self._label_idx.get(self.phase)
+        if label is None:
+            label = self._label_idx[self.phase] = len(self._labels)
+            self._labels.append(self.phase)
+        j = i * self.FIELDS
+        self._data[j]     = start
+        self._data[j + 1] = render_s
+        self._data[j + 2] = flip_s
+        self._data[j + 3] = interval
+        self._phase_idx[i] = label
+        self.n = i + 1
+
+    def pumped(self, start):
+        """One input pump began at `start` (perf_counter) and ends now. Gaps
+        are real time; their start is kept on the session clock, like frames."""
+        if self._last_pump is not None:
+            ended, ended_at = self._last_pump
+            gap = start - ended
+            if gap > self._gap_max:
+                self._gap_max, self._gap_phase = gap, self.phase
+            if gap * 1000 > self.budget_ms and len(self.gaps) < self.capacity:
+                self.gaps.append((ended_at, gap, self.phase))
+        self._last_pump = (time.perf_counter(), now())
+
+    def _frames(self, lo, hi):
+        d, f = self._data, self.FIELDS
+        return [(self._labels[self._phase_idx[i]],) + tuple(d[i * f:(i + 1) * f])
+                for i in range(lo, hi)]
+
+    def block_summary(self, name):
+        """Print and return percentiles, over-budget frames, the longest
+        stall (render + flip) and the longest gap between input pumps since
+        the previous call."""
+        if not self.enabled:
+            return None
+        frames, self._block = self._frames(self._block, self.n), self.n
+        gaps_over, self._gap_block = len(self.gaps) - self._gap_block, len(self.gaps)
+        gap_ms, gap_phase = self._gap_max * 1000, self._gap_phase
+        self._gap_max, self._gap_phase = 0.0, None
+        if not frames:
+            return None
+        pct   = _pct_ms
+        work  = [r + fl for _, _, r, fl, _ in frames]
+        worst = max(range(len(frames)), key=work.__getitem__)
+        summary = {
+            'frames':       len(frames),
+            'render_p50':   pct([f[2] for f in frames], 0.5),
+            'render_p95':   pct([f[2] for f in frames], 0.95),
+            'flip_p50':     pct([f[3] for f in frames], 0.5),
+            'flip_p95':     pct([f[3] for f in frames], 0.95),
+            'interval_p50': pct([f[4] for f in frames if f[4]], 0.5),
+            'over_budget':  sum(w * 1000 > self.budget_ms for w in work),
+            'stall_ms':     work[worst] * 1000,
+            'stall_phase':  frames[worst][0],
+            'gap_ms':       gap_ms,
+            'gap_phase':    gap_phase,
+            'gaps_over':    gaps_over,
+        }
+        print(f"FrameTimer: {name}: {summary['frames']} frames, "
+              f"render p50/p95 {summary['render_p50']:.2f}/{summary['render_p95']:.2f} ms, "
+              f"flip p50/p95 {summary['flip_p50']:.2f}/{summary['flip_p95']:.2f} ms, "
+              f"{summary['over_budget']} over {self.budget_ms:.1f} ms, longest stall "
+              f"{summary['stall_ms']:.2f} ms in '{summary['stall_phase']}'; "
+              f"input unpumped for up to {summary['gap_ms']:.2f} ms in "
+              f"'{summary['gap_phase']}' ({summary['gaps_over']} gaps over budget)")
+        return summary
+
+    def write(self, path):
+        """Write every recorded frame to `path` (CSV, ms relative to the
+        first frame). Returns True on success."""
+        if not self.enabled or not self.n:
+            return False
+        frames = self._frames(0, self.n)
+        t0 = frames[0][1]
+        try:
+            with open(path, 'w') as f:
+                f.write("Phase,StartMs,RenderMs,FlipMs,IntervalMs\n")
+                for phase, start, render, flip, interval in frames:
+                    f.write(f"{phase},{(start - t0) * 1000:.3f},{render * 1000:.3f},"
+                            f"{flip * 1000:.3f},{interval * 1000:.3f}\n")
+            if self.dropped:
+                print(f"FrameTimer: {self.dropped} frames past capacity were not recorded")
+            return True
+        except Exception as e:
+            print(f"FrameTimer: could not write {path} ({e})")
+            return False
+
+    def write_gaps(self, path):
+        """Write the over-budget gaps between input pumps to `path` (CSV, ms
+        relative to the first frame). Returns True on success."""
+        if not self.enabled or not self.gaps:
+            return False
+        t0 = self._data[0] if self.n else self.gaps[0][0]
+        try:
+            with open(path, 'w') as f:
+                f.write("Phase,StartMs,GapMs\n")
+                for start, gap, phase in self.gaps:
+                    f.write(f"{phase},{(start - t0) * 1000:.3f},{gap * 1000:.3f}\n")
+            return True
+        except Exception as e:
+            print(f"FrameTimer: could not write {path} ({e})")
+            return False
+
+
+# Shared instance; enabled by the paradigms' --frame_timing flag
+frames = FrameTimer()
+
+
+def session_output_dir(save_path, subject_id):
+    """Per-project results folder (<save_path>/<letters of subject_id>),
+    created on demand. None for an unknown or malformed subject id."""
+    match = re.match(r'^([A-Za-z]+)', subject_id or '')
+    if not match or subject_id == "UNKNOWN":
+        return None
+    project_dir = os.path.join(save_path, match.group(1))
+    os.makedirs(project_dir, exist_ok=True)
+    return project_dir
+
+def write_session_diagnostics(output_dir, subject_id, appendix, trigger):
+    """End-of-session diagnostics next to the results: frame timing and loop
+    gaps (if enabled), startup marks, the trigger delivery log (closing the
+    TriggerManager) and the clock alignment. `output_dir` None only closes
+    and reports."""
+    def path(kind):
+        return os.path.join(output_dir, f"{subject_id}_{kind}{appendix}.csv") if output_dir else None
+    if frames.enabled:
+        frames.block_summary("closing screens")
+        if output_dir:
+            frames.write(path('frames'))
+            frames.write_gaps(path('loopgaps'))
+    if output_dir:
+        startup.write(path('startup'))
+    trigger.close(log_path=path('triggers'))
+    clock_sync.sample("end")
+    if output_dir:
+        clock_sync.write(path('clocks'))
+
+
+# ---- Retained-mode scene -------------------------------------------------- #
+class Scene:
+    """What is currently on screen: named (surface, rect) items drawn in
+    insertion order over a solid background.
+
+    set()/remove()/show() only record what changed. present() repaints the
+    dirty rectangles and pushes just those with display.update(), and does
+    nothing at all when the picture is unchanged. Code that draws to the
+    screen behind the scene's back must call invalidate() afterwards.
+
+    `last_flip` is the now() timestamp taken as soon as the last display
+    update returned, i.e. when the new picture was handed to the display.
+    """
+    def __init__(self, screen, bg_color=(0, 0, 0)):
+        self.screen    = screen
+        self.bg_color  = bg_color
+        self.flips     = 0
+        self.last_flip = None
+        self._items   = {}      # name -> (surface, rect, key); dict order = z-order
+        self._dirty   = []
+        self._full    = True
+
+    def set(self, name, surface, rect=None, key=None):
+        """Place `surface` at `rect` under `name`. `key` identifies the content
+        (defaults to the surface itself); same key + same rect is a no-op."""
+        rect = pygame.Rect(rect) if rect is not None else surface.get_rect()
+        key  = id(surface) if key is None else key
+        old  = self._items.get(name)
+        if old is not None:
+            if old[2] == key and old[1] == rect:
+                return
+            self._dirty.append(old[1])
+        self._items[name] = (surface, rect, key)
+        self._dirty.append(rect)
+
+    def remove(self, name):
+        old = self._items.pop(name, None)
+        if old is not None:
+            self._dirty.append(old[1])
+
+    def touch(self, name):
+        """Repaint `name` on the next present() even though it is unchanged,
+        e.g. to get a flip (and timestamp) for a repeated stimulus."""
+        item = self._items.get(name)
+        if item is not None:
+            self._dirty.append(item[1])
+
+    def show(self, items):
+        """Make `items` [(name, surface, rect, key), ...] the whole scene."""
+        names = {item[0] for item in items}
+        for name in [n for n in self._items if n not in names]:
+            self.remove(name)
+        for name, surface, rect, key in items:
+            self.set(name, surface, rect, key)
+
+    def invalidate(self):
+        """Force a full repaint on the next present()."""
+        self._full = True
+
+    @property
+    def dirty(self):
+        return self._full or bool(self._dirty)
+
+    def _render(self):
+        """Paint the changes into the back buffer; returns the call that
+        pushes them to the display."""
+        if self._full:
+            self.screen.fill(self.bg_color)
+            for surf, rect, _ in self._items.values():
+                self.screen.blit(surf, rect)
+            return pygame.display.flip
+        areas = []
+        for area in self._dirty:
+            if area.width and area.height and area not in areas:
+                areas.append(area)
+        for area in areas:
+            self.screen.fill(self.bg_color, area)
+            for surf, rect, _ in self._items.values():
+                clip = rect.clip(area)
+                if clip.width and clip.height:
+                    self.screen.blit(surf, clip, clip.move(-rect.x, -rect.y))
+        return lambda: pygame.display.update(areas)
+
+    def present(self):
+        """Repaint what changed and push it to the display. Returns True if the
+        display was updated."""
+        if not self.dirty:
+            return False
+        timed = frames.enabled
+        if timed:
+            start, t0 = now(), time.perf_counter()
+        push = self._render()
+        if timed:
+            t1 = time.perf_counter()
+        push()
+        if timed:
+            t2 = time.perf_counter()
+        self.last_flip = now()
+        if timed:
+            frames.record(start, t1 - t0, t2 - t1, self.last_flip)
+        if not self.flips:
+            startup.mark('first frame')
+        self._dirty = []
+        self._full  = False
+        self.flips += 1
+        return True
+
+
+_scene = None
+
+def get_scene(screen):
+    """Return the shared Scene for `screen` (a new one if the display surface
+    was replaced, e.g. by another set_mode)."""
+    global _scene
+    if _scene is None or _scene.screen is not screen:
+        _scene = Scene(screen)
+    return _scene
+
+
+def clear_screen(screen):
+    """Blank the display through the shared scene."""
+    scene = get_scene(screen)
+    scene.show([])
+    return scene.present()
+
+
+def outline_surface(size, color=(255, 255, 255), width=2, bg_color=(0, 0, 0)):
+    """Opaque surface of `size` holding a rectangle outline (stimulus frame)."""
+    surf = pygame.Surface(size)
+    surf.fill(bg_color)
+    pygame.draw.rect(surf, color, surf.get_rect(), width)
+    return surf
+
+
+# ---- Asset preloading ----------------------------------------------------- #
+RESOURCE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             '..', 'paradigms', '_resources'))
+
+
+class AssetManager:
+    """Loads everything a profile needs up front, right after set_mode, so
+    timed phases never touch the disk. Images are convert()ed to the display
+    pixel format (and pre-scaled to the size display_message shows them at),
+    sounds are decoded into mixer.Sound, stimulus CSVs are read into
+    DataFrames. Handles are looked up by path relative to RESOURCE_DIR
+    (absolute paths work too).
+
+    Anything requested that was not preloaded is still loaded on the spot,
+    but counted in `late_loads` and reported, since that is a disk hit in the
+    middle of a session.
+    """
+    def __init__(self, root=RESOURCE_DIR):
+        self.root       = root
+        self.late_loads = 0
+        self.report     = []        # (name, kind, load_ms, bytes)
+        self._assets    = {}        # normalized abs path -> handle
+
+    def _key(self, name):
+        return os.path.normcase(os.path.normpath(os.path.join(self.root, str(name))))
+
+    # ---- loaders -------------------------------------------------------- #
+    def _load(self, name, kind):
+        key   = self._key(name)
+        start = time.perf_counter()
+        if kind == 'image':
+            handle  = pygame.image.load(key)
+            display = pygame.display.get_surface()
+            if display is not None:
+                # display_message never shows an image taller than 1/3 of the
+                # screen; keeping the full-size decode around is just memory
+                max_height = display.get_height() // 3
+                if handle.get_height() > max_height:
+                    new_width = int(handle.get_width() * max_height / handle.get_height())
+                    handle = pygame.transform.scale(handle, (new_width, max_height))
+                handle = handle.convert_alpha() if handle.get_alpha() is not None else handle.convert()
+            size = handle.get_pitch() * handle.get_height()
+        elif kind == 'sound':
+            handle = pygame.mixer.Sound(key)
+            freq, fmt, channels = pygame.mixer.get_init()
+            size = int(handle.get_length() * freq * channels * (abs(fmt) // 8))
+        else:
+            pd = startup.import_module('pandas')
+            handle = pd.read_csv(key)
+            size   = int(handle.memory_usage(deep=True).sum())
+        load_ms = (time.perf_counter() - start) * 1000
+        self._assets[key] = handle
+        self.report.append((os.path.relpath(key, self.root), kind, load_ms, size))
+        return handle
+
+    def _get(self, name, kind):
+        handle = self._assets.get(self._key(name))
+        if handle is None:
+            self.late_loads += 1
+            print(f"AssetManager: '{name}' was not preloaded; loading during session")
+            handle = self._load(name, kind)
+        return handle
+
+    def image(self, name):
+        return self._get(name, 'image')
+
+    def table(self, name):
+        return self._get(name, 'table')
+
+    def sound(self, name):
+        """mixer.Sound for `name`; if the mixer is down or can't decode it,
+        the file path instead (play_audio then streams it as before)."""
+        try:
+            return self._get(name, 'sound')
+        except Exception as e:
+            print(f"AssetManager: no sound for '{name}' ({e}); will stream")
+            return self._key(name)
+
+    # ---- preloading ----------------------------------------------------- #
+    def preload(self, images=(), sounds=(), tables=()):
+        for kind, names in (('table', tables), ('image', images), ('sound', sounds)):
+            for name in names:
+                if self._key(name) in self._assets:
+                    continue
+                try:
+                    self._load(name, kind)
+                except Exception as e:
+                    print(f"AssetManager: could not preload {kind} '{name}' ({e})")
+
+    def preload_profile(self, profile):
+        """Preload what `profile` (an entry of configs/profiles.json) uses."""
+        tables, images, sounds = [], [], ['beep.mp3']
+        stim_type = profile.get('stim_type')
+        if stim_type:
+            tables.append(stim_type)
+            self.preload(tables=tables)
+            suffix = 'num' if 'number' in stim_type.lower() else 'let'
+            table  = self._assets.get(self._key(stim_type))
+            blocks = [c for c in table.columns if not c.endswith('response')] if table is not None else []
+            images = [os.path.join('images', f"{b}_{suffix}.png") for b in blocks
+                      if os.path.exists(os.path.join(self.root, 'images', f"{b}_{suffix}.png"))]
+        if profile.get('repetitions'):
+            sounds += [f"{d.upper()}.mp3" for d in dict.fromkeys(profile['repetitions'])]
+            sounds += ['STOP.mp3'] + [f"countdown_{n}.mp3" for n in (1, 2, 3)]
+        if not pygame.mixer.get_init():
+            sounds = []     # session runs without audio (init_pygame(audio=False))
+        self.preload(images=images, sounds=sounds)
+        self.print_report()
+
+    def print_report(self):
+        total_ms    = sum(r[2] for r in self.report)
+        total_bytes = sum(r[3] for r in self.report)
+        for name, kind, load_ms, size in self.report:
+            print(f"AssetManager: {kind:<5} {name:<32} {load_ms:7.1f} ms {size / 1024:9.1f} KiB")
+        print(f"AssetManager: {len(self.report)} assets, {total_ms:.1f} ms, "
+              f"{total_bytes / (1024 * 1024):.2f} MiB")
+
+
+# Shared instance for the paradigms
+assets = AssetManager()
+
+
+# ---- Message layout cache ------------------------------------------------- #
+class LayoutCache:
+    """Composed display_message frames, keyed by everything that affects the
+    picture (message, font, size, image, position, screen size) and already
+    converted to the display pixel format. Waiting rooms that redraw the same
+    screen in a loop hit this instead of decoding / scaling / rendering again.
+
+    Scaled instruction images are kept separately so different messages over
+    the same image share one decode. Everything is dropped when the display
+    size changes or on clear() (called by load_strings on a language switch).
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+        self._frames     = OrderedDict()
+        self._images     = {}
+        self._size       = None
+
+    def clear(self):
+        self._frames.clear()
+        self._images.clear()
+
+    def _check_size(self, size):
+        if size != self._size:
+            if self._size is not None:
+                print(f"LayoutCache: display size {self._size} -> {size}; invalidating")
+            self.clear()
+            self._size = size
+
+    def get(self, key, size):
+        self._check_size(size)
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+            self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        self.misses += 1
+        self._frames[key] = frame
+        if len(self._frames) > self.max_entries:
+            self._frames.popitem(last=False)
+
+    def image(self, image_path, max_height):
+        """Decode + downscale `image_path` to at most `max_height`, once."""
+        key   = (str(image_path), max_height)
+        image = self._images.get(key)
+        if image is None:
+            image = assets.image(image_path)
+            if image.get_height() > max_height:
+                scale_factor = max_height / image.get_height()
+                new_width    = int(image.get_width() * scale_factor)
+                image = pygame.transform.scale(image, (new_width, max_height))
+            self._images[key] = image
+        return image
+
+
+# Shared instance for display_message
+layouts = LayoutCache()
+
+
+def _compose_message(font, message, custom_font_size, image_path, position,
+                     width_screen, height_screen, bg_color=(0, 0, 0)):
+    """Lay out a display_message screen into one surface covering just the
+    drawn area. Returns (surface, rect in screen coordinates)."""
     font_color = (255, 255, 255)
-    
-    screen.fill(bg_color)
-    text = []
-    rect = []
-    
-    # Set default position to center if not specified
-    if position is None:
-        position = (width_screen // 2, height_screen // 2)
-    
+    pieces = []
+
     # Load and display image if provided
     message_y_offset = 0
     if image_path and os.path.exists(image_path):
         try:
-            image = pygame.image.load(image_path)
-            # Resize image if needed
-            max_img_height = height_screen // 3
-            image_rect = image.get_rect()
-            if image_rect.height > max_img_height:
-                scale_factor = max_img_height / image_rect.height
-                new_width = int(image_rect.width * scale_factor)
-                image = pygame.transform.scale(image, (new_width, max_img_height))
-            
+            image = layouts.image(image_path, height_screen // 3)
             # Position the image above the text
             image_rect = image.get_rect(center=(position[0], height_screen // 4))
-            screen.blit(image, image_rect)
-            
+            pieces.append((image, image_rect))
+
             # Adjust message position to be below the image
             message_y_offset = image_rect.height // 2 + 20  # 20px spacing
         except Exception as e:
             print(f"Error loading image {image_path}: {e}")
-    
+
     if not isinstance(message, list):
         # Single message - use custom font size if provided, otherwise larger font
-        display_font = pygame.font.SysFont(None, custom_font_size if custom_font_size else 300)
-        text.append(display_font.render(message, True, font_color))
-        rect.append(text[0].get_rect(center=(position[0], position[1] + message_y_offset)))
+        text = glyphs.get(message, custom_font_size if custom_font_size else 300, font_color)
+        pieces.append((text, text.get_rect(center=(position[0], position[1] + message_y_offset))))
     else:
         # Multiple messages - use standard font size
         for i, line in enumerate(message):
-            text.append(font.render(line, True, font_color))
-            rect.append(text[i].get_rect(center=(position[0], position[1] + ((i-1)*120) + message_y_offset)))
-    
-    for line in range(len(text)):
-        screen.blit(text[line], rect[line])  
-    
-    pygame.display.flip()
+            text = font.render(line, True, font_color)
+            pieces.append((text, text.get_rect(center=(position[0], position[1] + ((i-1)*120) + message_y_offset))))
+
+    area  = pieces[0][1].unionall([r for _, r in pieces[1:]]) if pieces else pygame.Rect(0, 0, 0, 0)
+    frame = pygame.Surface(area.size)
+    frame.fill(bg_color)
+    for surf, rect in pieces:
+        frame.blit(surf, rect.move(-area.x, -area.y))
+    if pygame.display.get_surface() is not None:
+        frame = frame.convert()
+    return frame, area
+
+
+def display_message(screen, font, message, wait=0, custom_font_size=None, progress_file=None, 
+                   status=None, progress_start=None, progress_end=None, image_path=None, 
+                   position=None, width_screen=1920, height_screen=1080, on_shown=None):
+    # Set default position to center if not specified
+    if position is None:
+        position = (width_screen // 2, height_screen // 2)
+
+    key = (tuple(message) if isinstance(message, list) else message, font,
+           custom_font_size, str(image_path) if image_path else None,
+           tuple(position), (width_screen, height_screen))
+    layout = layouts.get(key, screen.get_size())
+    if layout is None:
+        layout = _compose_message(font, message, custom_font_size, image_path,
+                                  position, width_screen, height_screen)
+        layouts.put(key, layout)
+
+    # Only repaints / flips if the message actually differs from what is shown
+    scene = get_scene(screen)
+    scene.show([('message', layout[0], layout[1], key)])
+    flipped = scene.present()
+    if on_shown is not None:
+        # e.g. a trigger stamped with the flip that put the message up
+        on_shown(scene.last_flip if flipped else now())
     
     if wait:
-        start_time = pygame.time.get_ticks()
-        while pygame.time.get_ticks() - start_time < wait:
+        start_time = now()
+        while (now() - start_time) * 1000 < wait:
             # Update progress frequently during wait periods if progress file is provided
             if progress_file and status and progress_start is not None and progress_end is not None:
-                elapsed = pygame.time.get_ticks() - start_time
+                elapsed = (now() - start_time) * 1000
                 progress_percent = round(progress_start + (elapsed / wait) * (progress_end - progress_start), 2)
                 update_progress(progress_file, progress_percent, status)
                 
-            # Check for quit events
-            if check_for_quit():
+            # Sleep until the next progress update, waking early only to quit
+            remaining = wait - (now() - start_time) * 1000
+            if wait_for_event(timeout_ms=min(50, remaining)) == 'quit':
                 return True
-                
-            # Small delay to prevent high CPU usage
-            pygame.time.wait(50)
     return False
 
 def wait_period(screen, duration_ms, progress_file=None, status=None, progress_start=0, progress_end=0):
@@ -411,20 +2303,19 @@ def wait_period(screen, duration_ms, progress_file=None, status=None, progress_s
     Returns:
         bool: True if user quit during wait, False otherwise
     """
-    start_time = pygame.time.get_ticks()
+    start_time = now()
     
-    while pygame.time.get_ticks() - start_time < duration_ms:
-        if check_for_quit():
-            return True
-            
+    while (now() - start_time) * 1000 < duration_ms:
         # Update progress if needed
         if progress_file and status and progress_end > progress_start:
-            elapsed = pygame.time.get_ticks() - start_time
+            elapsed = (now() - start_time) * 1000
             progress_percent = round(progress_start + (elapsed / duration_ms) * (progress_end - progress_start), 2)
             update_progress(progress_file, progress_percent, status)
             
-        # Small delay to prevent high CPU usage
-        pygame.time.wait(100)
+        # Sleep until the next progress update, waking early only to quit
+        remaining = duration_ms - (now() - start_time) * 1000
+        if wait_for_event(timeout_ms=min(100, remaining)) == 'quit':
+            return True
         
     return False
 
@@ -433,21 +2324,90 @@ def play_audio(audio_file):
     Play an audio file and wait for it to finish
     
     Parameters:
-    - audio_file: path to audio file
+    - audio_file: preloaded pygame.mixer.Sound (see AssetManager.sound), or a
+      path to an audio file, which is streamed from disk
     
     Returns:
         bool: True if user quit during playback, False otherwise
     """
     try:
-        pygame.mixer.music.load(audio_file)
-        pygame.mixer.music.play()
+        if _clock.virtual:
+            # Nothing audible to wait on; let the clip's length pass instead
+            length_ms = audio_file.get_length() * 1000 if isinstance(audio_file, pygame.mixer.Sound) else 0
+            return bool(length_ms) and wait_for_event(timeout_ms=length_ms) == 'quit'
+        if isinstance(audio_file, pygame.mixer.Sound):
+            channel = audio_file.play()
+            is_busy = channel.get_busy if channel is not None else (lambda: False)
+        else:
+            pygame.mixer.music.load(audio_file)
+            pygame.mixer.music.play()
+            is_busy = pygame.mixer.music.get_busy
         
         # Wait until the audio is finished playing
-        while pygame.mixer.music.get_busy():
-            if check_for_quit():
+        while is_busy():
+            if wait_for_event(timeout_ms=100) == 'quit':
                 return True
-            pygame.time.wait(100)
     except Exception as e:
         print(f"Error playing audio {audio_file}: {e}")
         
-    return False
\ No newline at end of file
+    return False
+
+if __name__ == "__main__":
+    # Response-capture calibration, e.g. headless:
+    #   SDL_VIDEODRIVER=dummy python auxfunc/paradigm_utils.py --calibrate_input
+    import argparse
+    parser = argparse.ArgumentParser(description='Paradigm utility self-checks')
+    parser.add_argument('--calibrate_input', action='store_true',
+                        help='Measure response timestamp error with synthetic key events; '
+                             f'fails (exit 1) on a missed/duplicated event or p95 over {CALIBRATION_P95_MS} ms')
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--max_p95_ms', type=float, default=CALIBRATION_P95_MS,
+                        help='Fail the input calibration above this p95 timestamp error')
+    # Startup budget, e.g.: python auxfunc/paradigm_utils.py --startup_budget paradigms/nback.py
+    parser.add_argument('--startup_budget', metavar='PARADIGM',
+                        help='Launch PARADIGM headless with -X importtime and fail if the '
+                             f'first frame takes longer than {STARTUP_BUDGET_MS} ms')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--check_windows', action='store_true',
+                        help='Exercise the window lookups against the stand-in backend')
+    args = parser.parse_args()
+    if args.check_windows:
+        ok, stats = check_window_resolver()
+        print(f"check_window_resolver: {'ok' if ok else 'FAILED'} ({stats})")
+        if not ok:
+            raise SystemExit(1)
+    if args.calibrate_input:
+        init_pygame(audio=False)
+        pygame.display.set_mode((320, 240))
+        result = calibrate_response_capture(args.events, max_p95_ms=args.max_p95_ms)
+        print(f"calibrate_response_capture: {'ok' if result['ok'] else 'FAILED'} {result}")
+        pygame.quit()
+        if not result['ok']:
+            raise SystemExit(1)
+    if args.startup_budget:
+        import subprocess, sys
+        firsts, imports = [], {}
+        for _ in range(args.runs):
+            run = subprocess.run([sys.executable, '-X', 'importtime', args.startup_budget,
+                                  '--virtual_clock'], capture_output=True, text=True)
+            found = re.search(r'Startup \(from [^)]*\): (.*)', run.stdout)
+            first = re.search(r'first frame (\d+) ms', run.stdout)
+            if not first:
+                print(f"startup_budget: no first frame reported (exit {run.returncode})")
+                print(run.stderr[-2000:])
+                sys.exit(1)
+            firsts.append(int(first.group(1)))
+            print(f"startup_budget: {found.group(1)}")
+            for line in run.stderr.splitlines():
+                row = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\S.*)', line)
+                if row:     # top-level imports only (nested ones are indented)
+                    imports.setdefault(row.group(2), []).append(int(row.group(1)) / 1000)
+        print("startup_budget: slowest top-level imports (median ms):")
+        medians = {name: sorted(ms)[len(ms) // 2] for name, ms in imports.items()}
+        for name, ms in sorted(medians.items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  {ms:8.1f}  {name}")
+        median = sorted(firsts)[len(firsts) // 2]
+        ok = median <= STARTUP_BUDGET_MS
+        print(f"startup_budget: first frame median {median} ms over {len(firsts)} runs "
+              f"({'within' if ok else 'OVER'} {STARTUP_BUDGET_MS} ms)")
+        sys.exit(0 if ok else 1)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pre-warmed paradigm process for the control panel.
+
+Started ahead of time, it pays for the interpreter, the heavy imports
+(pygame/numpy/pandas/win32, pylsl and pyxid2 if installed), init_pygame()
+and the system font scan while nobody is waiting. The audio device is left
+closed: an idle worker would otherwise hold it between sessions, and the
+paradigm's own init_pygame() opens the mixer at handover if it needs sound. It then blocks on stdin
+for one JSON line, {"script": <paradigm path>, "argv": [<flags>]}, and runs
+that paradigm as __main__ with those flags, exactly as a fresh
+`python <script> <flags>` would. One session per worker; the panel spawns a
+new one afterwards. EOF on stdin (panel closed) exits without running.
+"""
+import sys, os, json, time, runpy
+
+t_start = time.perf_counter()
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, parent_dir)
+
+import pygame
+import numpy, pandas
+from auxfunc import paradigm_utils
+
+for optional in ('pylsl', 'pyxid2'):
+    try:
+        __import__(optional)
+    except ImportError:
+        pass
+
+paradigm_utils.init_pygame(audio=False)
+pygame.font.SysFont(None, 120)      # first SysFont call scans the system fonts
+
+print(f"paradigm_worker: warm in {(time.perf_counter() - t_start) * 1000:.0f} ms")
+
+
+def main():
+    line = sys.stdin.readline()
+    if not line:
+        return      # control panel went away before a session started
+    request = json.loads(line)
+    t_go = time.perf_counter()
+    paradigm_utils.startup.restart()    # the session's startup begins now
+
+    script = request['script']
+    sys.argv = [script] + list(request.get('argv', []))
+    sys.path.insert(0, os.path.dirname(script))
+    print(f"paradigm_worker: starting {os.path.basename(script)} "
+          f"({(time.perf_counter() - t_go) * 1000:.1f} ms after request)")
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == "__main__":
+    main()
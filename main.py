@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import subprocess, sys, os, json, tempfile, gc, time
+import subprocess, sys, os, json, tempfile, gc, time, socket, threading, re, logging, queue
+from collections import deque
+from logging.handlers import RotatingFileHandler
 
 
 # Color palette for indicators
@@ -27,6 +29,30 @@ LSL_STREAM_TYPE      = 'Markers'
 LSL_SOURCE_ID        = 'paradigm_triggers'
 LSL_HANDOFF_DELAY_S  = 0.2   # let liblsl tear down before the subprocess opens
 
+# Capability probing: last result cached on disk for the first paint, then
+# re-probed on a background thread (paused while a paradigm owns the hardware)
+CAPS_CACHE_PATH      = os.path.join(tempfile.gettempdir(), 'cbgparadigm_capabilities.json')
+CAPS_REPROBE_S       = 10.0
+PROBE_WAIT_S         = 5.0     # a launch waits this long for an in-flight probe
+PROBE_RETRY_MS       = 50
+
+# Progress channel: the paradigm connects back to a loopback listener and
+# streams JSON lines; the temp-file protocol remains as the fallback
+# (control_panel.progress_channel = "file" forces it).
+PROGRESS_HOST        = '127.0.0.1'
+
+# Paradigm stdout/stderr: drained continuously, teed to a rotating log per run
+SESSION_LOG_MAX_BYTES = 5 * 1024 * 1024
+SESSION_LOG_BACKUPS   = 3
+SESSION_LOG_TAIL      = 200     # lines kept in memory for the log viewer
+SESSION_LOG_LINE_MAX  = 8192    # longest line read at once from a pipe
+ERROR_PATTERN         = re.compile(r'Traceback|Error|Exception|failed', re.IGNORECASE)
+
+# Pre-warmed paradigm process (imports + pygame.init done before Start);
+# control_panel.prewarm_worker = false launches cold every time
+WORKER_SCRIPT         = os.path.join('auxfunc', 'paradigm_worker.py')
+WORKER_RESPAWN_MS     = 1000    # after a session ends, once the LSL handoff settled
+
 
 # Configuration Loading
 # ----------------------------------------------------------------------------
@@ -57,7 +83,7 @@ def build_experiments_dict(profiles):
 
 # Capability Probing
 # ----------------------------------------------------------------------------
-def probe_capabilities():
+def probe_capabilities(verbose=True):
     """
     Non-invasive probe: check for hardware/library presence without holding
     any handles open. The control panel will create its own LSL outlet
@@ -77,7 +103,8 @@ def probe_capabilities():
             except Exception:
                 pass
     except ImportError:
-        print("probe: pyxid2 not installed (TTL unavailable)")
+        if verbose:
+            print("probe: pyxid2 not installed (TTL unavailable)")
     except Exception as e:
         print(f"probe: TTL detection failed -> {e}")
 
@@ -86,13 +113,83 @@ def probe_capabilities():
         import pylsl  # noqa: F401
         caps['lsl'] = True
     except ImportError:
-        print("probe: pylsl not installed (LSL unavailable)")
+        if verbose:
+            print("probe: pylsl not installed (LSL unavailable)")
     except Exception as e:
         print(f"probe: LSL check failed -> {e}")
 
     return caps
 
 
+def load_cached_capabilities():
+    """Capabilities seen by the last probe (any run), or nothing-but-keys."""
+    caps = {'ttl': False, 'lsl': False, 'key': True}
+    try:
+        with open(CAPS_CACHE_PATH, 'r') as f:
+            caps.update({k: bool(v) for k, v in json.load(f).items() if k in caps})
+    except (OSError, ValueError):
+        pass
+    return caps
+
+
+def save_cached_capabilities(caps):
+    try:
+        with open(CAPS_CACHE_PATH, 'w') as f:
+            json.dump(caps, f)
+    except OSError as e:
+        print(f"probe: could not cache capabilities -> {e}")
+
+
+class CapabilityProber:
+    """
+    Runs probe_capabilities() on a daemon thread, right away and then every
+    `interval` seconds, and puts each result that differs from the previous
+    one on `results` (a queue.Queue) for the Tk thread to apply. pause()
+    waits out an in-flight probe and stops probing, since enumerating XID
+    devices opens their serial ports, which a running paradigm owns.
+    """
+    def __init__(self, interval=CAPS_REPROBE_S):
+        self.interval = interval
+        self.results  = queue.Queue()
+        self._last    = None
+        self._lock    = threading.Lock()     # held for the duration of a probe
+        self._paused  = threading.Event()
+        self._stop    = threading.Event()
+        self._kick    = threading.Event()
+        threading.Thread(target=self._run, name='probe', daemon=True).start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            caps = None
+            with self._lock:
+                # Re-checked under the lock: pause() may have set it while
+                # this thread was waking up, and then only waits for the lock
+                if not self._paused.is_set():
+                    caps = probe_capabilities(verbose=self._last is None)
+            if caps is not None and caps != self._last:
+                self._last = caps
+                self.results.put(caps)
+            self._kick.wait(self.interval)
+            self._kick.clear()
+
+    def pause(self):
+        """Stop probing. Returns False while a probe is still in flight (it
+        may hold the XID ports); call again until True. Never blocks."""
+        self._paused.set()
+        if not self._lock.acquire(blocking=False):
+            return False
+        self._lock.release()
+        return True
+
+    def resume(self):
+        self._paused.clear()
+        self._kick.set()        # re-probe now: hardware may have changed meanwhile
+
+    def stop(self):
+        self._stop.set()
+        self._kick.set()
+
+
 def determine_mode(caps):
     """Strict cascade: TTL > LSL > KEY."""
     if caps.get('ttl'):
@@ -160,6 +257,249 @@ class ExportResultsWindow:
         self.window.destroy()
 
 
+# LSL Relay
+# ----------------------------------------------------------------------------
+class LSLRelay:
+    """
+    Lets the control panel keep the TriggerStream outlet for the whole day
+    (control_panel.lsl_relay = true). The paradigm's LSLTransport sends
+    'value,stamp,sent' lines over loopback UDP instead of opening its own
+    outlet; they are pushed here with the paradigm's stamp, so consumers
+    never see the outlet drop and the marker times are unchanged. The added
+    latency (push time - send time, both on the LSL clock) is kept per run.
+    """
+    def __init__(self, get_outlet):
+        import pylsl
+        self._clock  = pylsl.local_clock
+        self._outlet = get_outlet
+        self._sock   = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((PROGRESS_HOST, 0))
+        self.target  = f"udp://{PROGRESS_HOST}:{self._sock.getsockname()[1]}"
+        self.reset_stats()
+        threading.Thread(target=self._run, name='lsl-relay', daemon=True).start()
+        print(f"ControlPanel: LSL relay listening on {self.target}")
+
+    def reset_stats(self):
+        self.latencies_ms = deque(maxlen=10000)
+        self.relayed = 0
+        self.dropped = 0        # arrived while the outlet was down
+
+    def _run(self):
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(65536)
+            except ConnectionResetError:
+                continue        # Windows: ICMP from an earlier reply's dead peer
+            except OSError:
+                return          # socket closed
+            if data == b'ping':
+                self._sock.sendto(b'pong', addr)
+                continue
+            try:
+                rows = [line.split(',') for line in data.decode().splitlines() if line]
+                values = [[int(v)] for v, _, _ in rows]
+                stamps = [float(t) for _, t, _ in rows]
+                sent   = [float(t) for _, _, t in rows]
+            except ValueError:
+                print(f"ControlPanel: LSL relay dropped malformed datagram {data[:40]!r}")
+                continue
+            outlet = self._outlet()
+            if outlet is None:
+                self.dropped += len(rows)
+                continue
+            if len(values) == 1:
+                outlet.push_sample(values[0], stamps[0])
+            else:
+                outlet.push_chunk(values, stamps)
+            pushed = self._clock()
+            self.relayed += len(rows)
+            self.latencies_ms.extend((pushed - t) * 1000 for t in sent)
+
+    def summary(self):
+        if not self.latencies_ms:
+            return f"LSL relay: {self.relayed} markers, {self.dropped} dropped"
+        ordered = sorted(self.latencies_ms)
+        median  = ordered[len(ordered) // 2]
+        p99     = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return (f"LSL relay: {self.relayed} markers, {self.dropped} dropped, added latency "
+                f"median {median:.3f} ms, p99 {p99:.3f} ms, max {ordered[-1]:.3f} ms")
+
+    def close(self):
+        self._sock.close()
+
+
+# Export Monitor
+# ----------------------------------------------------------------------------
+EXPORT_PROGRESS_MARKER = "=== EXPORT_PROGRESS ==="
+EXPORT_RATE_WINDOW_S   = 5.0     # throughput is averaged over this window
+
+
+class ExportMonitor:
+    """
+    Reads extract_record.py --progress output on a daemon thread. Progress
+    lines update per-target byte counts and statuses; everything else is
+    kept for parse_export_results() once the process exits. The Tk thread
+    polls snapshot(), which also derives throughput and ETA.
+    """
+    def __init__(self, subject, process):
+        self.subject  = subject
+        self.process  = process
+        self.started  = time.monotonic()
+        self.found    = {}      # target -> (files, bytes)
+        self.copied   = {}      # target -> bytes
+        self.status   = {}      # target -> status
+        self.output   = []
+        self.done     = False
+        self._rate    = deque()  # (time, total bytes copied)
+        self._lock    = threading.Lock()
+        threading.Thread(target=self._read, name='export-reader', daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            if line.startswith(EXPORT_PROGRESS_MARKER):
+                try:
+                    self._apply(json.loads(line[len(EXPORT_PROGRESS_MARKER):]))
+                except ValueError:
+                    pass
+                continue
+            self.output.append(line)
+        self.process.wait()
+        with self._lock:
+            self.done = True
+
+    def _apply(self, event):
+        target = event.get('target')
+        with self._lock:
+            if event.get('event') == 'found':
+                self.found[target] = (event.get('files', 0), event.get('bytes', 0))
+            elif event.get('event') == 'copied':
+                self.copied[target] = event.get('bytes', 0)
+                now = time.monotonic()
+                self._rate.append((now, sum(self.copied.values())))
+                self._trim(now)
+            elif event.get('event') == 'status':
+                self.status[target] = event.get('status')
+
+    def _trim(self, now):
+        while len(self._rate) > 1 and now - self._rate[0][0] > EXPORT_RATE_WINDOW_S:
+            self._rate.popleft()
+
+    def snapshot(self):
+        """Totals so far: copied/total bytes, bytes/s, ETA in s (None until
+        there is a rate), current target, done. The rate is taken up to now,
+        so it decays while no bytes arrive and drops to 0 once the window
+        holds no progress (a stalled copy)."""
+        with self._lock:
+            total  = sum(b for _, b in self.found.values())
+            copied = sum(self.copied.values())
+            now    = time.monotonic()
+            self._trim(now)
+            rate   = None
+            if len(self._rate) >= 2:
+                rate = (self._rate[-1][1] - self._rate[0][1]) / (now - self._rate[0][0])
+            elif self._rate and now - self._rate[0][0] > EXPORT_RATE_WINDOW_S:
+                rate = 0.0
+            active = next((t for t in self.found if t not in self.status), None)
+            return {'copied': copied, 'total': total, 'rate': rate,
+                    'eta': (total - copied) / rate if rate else None,
+                    'target': active, 'elapsed': time.monotonic() - self.started,
+                    'done': self.done}
+
+
+def _fmt_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f} {unit}" if unit == 'B' else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+# Session Log
+# ----------------------------------------------------------------------------
+class SessionLog:
+    """
+    Drains a paradigm subprocess's stdout and stderr on two daemon threads
+    so it can never block on a full pipe, and tees every line into a
+    rotating log file. Keeps the last SESSION_LOG_TAIL lines and line/error
+    counters for the control panel to read; nothing here touches Tk.
+    """
+    def __init__(self, path):
+        self.path   = path
+        self.tail   = deque(maxlen=SESSION_LOG_TAIL)
+        self.lines  = 0
+        self.errors = 0
+        self._lock  = threading.Lock()
+        self._threads = []
+        self._open    = 0       # pipes still being drained
+
+        self._logger = logging.getLogger(f"session.{id(self)}")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        try:
+            handler = RotatingFileHandler(path, maxBytes=SESSION_LOG_MAX_BYTES,
+                                          backupCount=SESSION_LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger.addHandler(handler)
+        except OSError as e:
+            print(f"SessionLog: could not open {path} ({e}); keeping the tail only")
+            self.path = None
+
+    def attach(self, process):
+        for stream, name in ((process.stdout, 'out'), (process.stderr, 'err')):
+            if stream is None:
+                continue
+            with self._lock:
+                self._open += 1
+            t = threading.Thread(target=self._drain, args=(stream, name),
+                                 name=f"drain-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _drain(self, stream, name):
+        with stream:
+            for raw in iter(lambda: stream.readline(SESSION_LOG_LINE_MAX), b''):
+                line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+                is_error = name == 'err' and bool(ERROR_PATTERN.search(line))
+                with self._lock:
+                    self.lines += 1
+                    self.errors += is_error
+                    self.tail.append(f"[{name}] {line}")
+                self._logger.log(logging.ERROR if is_error else logging.INFO,
+                                 "[%s] %s", name, line)
+        with self._lock:
+            self._open -= 1
+            last = self._open == 0
+        if last:
+            self._release()
+
+    def snapshot(self):
+        """(lines, errors, tail lines) as of now."""
+        with self._lock:
+            return self.lines, self.errors, list(self.tail)
+
+    def close(self, timeout=0.5):
+        """Give the drain threads a moment to reach EOF after the process
+        exits; the last one to finish releases the log file."""
+        for t in self._threads:
+            t.join(timeout)
+
+    def _release(self):
+        for handler in list(self._logger.handlers):
+            handler.close()
+            self._logger.removeHandler(handler)
+
+
+def session_log_path(paths_config, subject, profile_key):
+    """<project_root>/logs/<subject>_<profile>_<timestamp>.log, or the temp
+    directory when the project root isn't reachable."""
+    log_dir = os.path.join(paths_config.get('project_root', ''), 'logs')
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+    except OSError:
+        log_dir = tempfile.gettempdir()
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    return os.path.join(log_dir, f"{subject}_{profile_key}_{stamp}.log")
+
+
 # Control Panel
 # ----------------------------------------------------------------------------
 class ControlPanel:
@@ -186,8 +526,9 @@ class ControlPanel:
 
         self.experiments = build_experiments_dict(self.profiles)
 
-        # Probe capabilities and decide cascade-winning mode
-        self.capabilities = probe_capabilities()
+        # Paint from the last known capabilities; the prober confirms them
+        # (and catches hot-plugged hardware) in the background
+        self.capabilities = load_cached_capabilities()
         self.active_mode  = determine_mode(self.capabilities)
 
         # LSL outlet handle: control panel owns this between paradigm runs so
@@ -214,6 +555,10 @@ class ControlPanel:
             subject_frame, text="Export", command=self.export_data, width=6
         )
         self.export_button.pack(side="right")
+        self.export_label = ttk.Label(recording_frame, text="",
+                                      font=("TkDefaultFont", 9), foreground="#555555")
+        self.export_label.pack(fill="x")
+        self._export = None
 
         # Mode indicator (replaces old LSL checkbox area)
         mode_frame = ttk.Frame(recording_frame)
@@ -226,7 +571,7 @@ class ControlPanel:
         )
         self.mode_dot.pack(side="left")
         self.mode_label = tk.Label(
-            mode_frame, text=f"{self.active_mode} mode",
+            mode_frame, text=f"{self.active_mode} mode (checking...)",
             font=("TkDefaultFont", 10, "bold")
         )
         self.mode_label.pack(side="left", padx=(2, 0))
@@ -312,6 +657,13 @@ class ControlPanel:
         self.percentage_label = ttk.Label(progress_frame, text="0%")
         self.percentage_label.pack(fill="x")
 
+        log_frame = ttk.Frame(progress_frame)
+        log_frame.pack(fill="x", pady=(5, 0))
+        self.log_label = ttk.Label(log_frame, text="Log: —",
+                                   font=("TkDefaultFont", 9), foreground="#555555")
+        self.log_label.pack(side="left", fill="x", expand=True)
+        ttk.Button(log_frame, text="View log", command=self.show_session_log).pack(side="right")
+
         # ---- Bottom: termination hint + capability indicators ----------- #
         self.termination_label = ttk.Label(
             main_frame,
@@ -332,18 +684,83 @@ class ControlPanel:
 
         # Process state
         self.process = None
-        self.temp_file = None
+        self._session_open = False
+        self._probe_wait   = None     # launch deferred until this deadline
+        self.session_log = None
+        self._log_counts = None
+        self.temp_file = None      # progress file path (file fallback)
         self.experiment_complete = False
 
+        # Progress channel state (reader thread -> queue -> Tk wake-up)
+        self._progress_server  = None
+        self._progress_updates = queue.Queue()
+        self._open_progress_wakeup()
+
+        # Warm worker for the next session (see auxfunc/paradigm_worker.py)
+        self._worker = None
+        self._spawn_worker()
+
         # Bring up the placeholder LSL outlet now that the UI exists
         if self.capabilities['lsl']:
             self._create_lsl_outlet(initial=True)
         else:
             self._set_lsl_dot(COLOR_BAD)
 
+        # Optional relay: the outlet stays here, paradigms send markers to it
+        self._lsl_relay = None
+        self._start_lsl_relay()
+
+        # Background capability probing; results arrive on a queue
+        self.prober = CapabilityProber()
+
         # Periodic poll
         self.check_progress()
 
+    # ---- Capabilities -------------------------------------------------- #
+    def _poll_capabilities(self):
+        """Apply the newest probe result, if any (Tk thread)."""
+        caps = None
+        try:
+            while True:
+                caps = self.prober.results.get_nowait()
+        except queue.Empty:
+            pass
+        if caps is not None:
+            self._apply_capabilities(caps)
+
+    def _apply_capabilities(self, caps):
+        changed = caps != self.capabilities
+        self.capabilities = caps
+        self.active_mode  = determine_mode(caps)
+        self.mode_dot.config(foreground=MODE_COLORS[self.active_mode])
+        self.mode_label.config(text=f"{self.active_mode} mode")
+        self._ttl_dot.config(foreground=COLOR_OK if caps['ttl'] else COLOR_BAD)
+        self._key_dot.config(foreground=COLOR_OK if caps['key'] else COLOR_BAD)
+        if caps['lsl'] and self._lsl_outlet is None and not self._session_running():
+            self._create_lsl_outlet()
+            self._start_lsl_relay()
+        elif not caps['lsl'] and self._lsl_outlet is None:
+            self._set_lsl_dot(COLOR_BAD)
+        if changed:
+            print(f"ControlPanel: capabilities now {caps} -> {self.active_mode} mode")
+            save_cached_capabilities(caps)
+
+    def _session_running(self):
+        return self._session_open
+
+    def _reclaim_lsl(self):
+        self._create_lsl_outlet()
+        self._start_lsl_relay()
+
+    def _start_lsl_relay(self):
+        if (self._lsl_relay is not None or self._lsl_outlet is None
+                or not self.panel_config.get('lsl_relay', False)):
+            return
+        try:
+            self._lsl_relay = LSLRelay(lambda: self._lsl_outlet)
+        except Exception as e:
+            print(f"ControlPanel: LSL relay unavailable ({e}); using outlet handoff")
+
     # ---- UI helpers ---------------------------------------------------- #
     def _make_cap_indicator(self, parent, label, color):
         frame = ttk.Frame(parent)
@@ -437,6 +854,12 @@ class ControlPanel:
 
     # ---- Export -------------------------------------------------------- #
     def export_data(self):
+        """Start extract_record.py in the background; _poll_export() follows
+        its progress so the panel stays usable (including starting the next
+        experiment) while multi-GB folders copy."""
+        if self._export is not None:
+            messagebox.showinfo("Export", f"Export for {self._export.subject} is still running")
+            return
         subject = self.validate_subject_id()
         if not subject:
             return
@@ -447,25 +870,58 @@ class ControlPanel:
             return
 
         print(f"Exporting data for {subject}...")
-        self.root.update()
         try:
             cmd_args = [sys.executable, export_script,
                         "--subject_id",   subject,
                         "--project_root", self.paths_config.get('project_root', ''),
                         "--nirx_data",    self.paths_config.get('nirx_data', ''),
-                        "--eeg_data",     self.paths_config.get('emotiv_data', '')]
+                        "--eeg_data",     self.paths_config.get('emotiv_data', ''),
+                        "--progress"]
             process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE, text=True)
-            stdout, stderr = process.communicate()
-            export_results = self.parse_export_results(stdout)
-            if export_results:
-                ExportResultsWindow(self.root, export_results)
-            elif process.returncode == 0:
-                messagebox.showinfo("Export Complete", f"Data exported for {subject}")
-            else:
-                self._show_export_error(subject, f"Export failed (code {process.returncode})")
+                                       stderr=subprocess.STDOUT, text=True,
+                                       encoding='utf-8', errors='replace',
+                                       env=dict(os.environ, PYTHONUNBUFFERED='1',
+                                                PYTHONIOENCODING='utf-8'))
         except Exception as e:
             self._show_export_error(subject, str(e))
+            return
+        self._export = ExportMonitor(subject, process)
+        self.export_button.state(['disabled'])
+        self.export_label.config(text=f"Export {subject}: searching...")
+        self._poll_export()
+
+    def _poll_export(self):
+        export = self._export
+        snap   = export.snapshot()
+        if not snap['done']:
+            text = f"Export {export.subject}: "
+            if snap['total']:
+                text += f"{_fmt_bytes(snap['copied'])} / {_fmt_bytes(snap['total'])}"
+                if snap['rate']:
+                    eta = int(snap['eta'])
+                    text += f", {_fmt_bytes(snap['rate'])}/s, ETA {eta // 60}:{eta % 60:02d}"
+                elif snap['rate'] == 0:
+                    text += ", stalled"
+                if snap['target']:
+                    text += f" ({snap['target']})"
+            else:
+                text += "searching..."
+            self.export_label.config(text=text)
+            self.root.after(250, self._poll_export)
+            return
+
+        self._export = None
+        self.export_button.state(['!disabled'])
+        self.export_label.config(text=f"Export {export.subject}: {_fmt_bytes(snap['copied'])} "
+                                      f"copied in {snap['elapsed']:.0f} s")
+        export_results = self.parse_export_results("".join(export.output))
+        if export_results:
+            ExportResultsWindow(self.root, export_results)
+        elif export.process.returncode == 0:
+            messagebox.showinfo("Export Complete", f"Data exported for {export.subject}")
+        else:
+            self._show_export_error(export.subject,
+                                    f"Export failed (code {export.process.returncode})")
 
     def _show_export_error(self, subject, message):
         error_results = {
@@ -552,17 +1008,43 @@ class ControlPanel:
         script_dir = os.path.dirname(os.path.abspath(__file__))
         script_path = os.path.join(script_dir, 'paradigms', module_name)
 
+        # No probing while the paradigm owns the XID port. A probe still in
+        # flight is waited out on the Tk loop (retrying the launch), never by
+        # blocking it; past PROBE_WAIT_S the launch is refused.
+        if not self.prober.pause():
+            if self._probe_wait is None:
+                self._probe_wait = time.monotonic() + PROBE_WAIT_S
+                self.start_button.state(['disabled'])
+                self.status_label.config(text="Waiting for the hardware probe to finish...")
+            if time.monotonic() < self._probe_wait:
+                self.root.after(PROBE_RETRY_MS, self.start_experiment)
+                return
+            self._probe_wait = None
+            self.prober.resume()
+            self.start_button.state(['!disabled'])
+            self.status_label.config(text="Select experiment to start...")
+            messagebox.showerror("Error", "The hardware probe is still running; "
+                                          "try again in a moment")
+            return
+        self._probe_wait = None
+
         try:
-            # Progress IPC
-            self.temp_file = tempfile.NamedTemporaryFile(mode='w+', delete=False, suffix='.json')
-            temp_path = self.temp_file.name
-            json.dump({"progress": 0, "status": f"Starting {experiment_name}..."},
-                      self.temp_file)
-            self.temp_file.flush()
+            # Progress IPC: socket channel, temp file if that can't be opened
+            temp_path = self._open_progress_channel()
+            if temp_path is None:
+                # Only the path is kept: an open handle here would make the
+                # paradigm's os.replace() of the file fail on Windows
+                with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as f:
+                    json.dump({"progress": 0, "status": f"Starting {experiment_name}..."}, f)
+                self.temp_file = temp_path = f.name
 
             # Yield the LSL outlet to the subprocess BEFORE spawning it, so
             # the subprocess's TriggerManager can claim the source_id cleanly.
-            self._yield_lsl_to_subprocess()
+            # With the relay the outlet stays here and markers come to us.
+            if self._lsl_relay is None:
+                self._yield_lsl_to_subprocess()
+            else:
+                self._lsl_relay.reset_stats()
 
             # Unified flag-style args for both paradigm modules
             language_code = LANGUAGES.get(self.selected_language.get(), 'en')
@@ -574,11 +1056,25 @@ class ControlPanel:
                         "--use_lsl"]   # always; TriggerManager handles availability
             if self.use_beep_var.get():
                 cmd_args.append("--use_sound")
-
-            self.process = subprocess.Popen(
-                cmd_args, stderr=subprocess.PIPE, stdout=subprocess.PIPE
-            )
-            print(f"Process started with PID: {self.process.pid}")
+            if self._lsl_relay is not None:
+                cmd_args += ["--lsl_relay", self._lsl_relay.target]
+
+            # Unbuffered so the log shows lines as they happen; SessionLog
+            # drains both pipes for the lifetime of the process
+            if self.session_log:
+                self.session_log.close(timeout=0)
+            self.session_log = SessionLog(session_log_path(self.paths_config, subject, profile_key))
+            self._log_counts = None
+            self.process = self._start_in_worker(script_path, cmd_args[2:])
+            if self.process is None:
+                self.process = subprocess.Popen(
+                    cmd_args, stderr=subprocess.PIPE, stdout=subprocess.PIPE,
+                    env=dict(os.environ, PYTHONUNBUFFERED='1')
+                )
+                print(f"Process started cold with PID: {self.process.pid}")
+            self.session_log.attach(self.process)
+            self._session_open = True
+            print(f"Session log: {self.session_log.path}")
 
             self.start_button.state(['disabled'])
             self.experiment_dropdown.state(['disabled'])
@@ -588,74 +1084,263 @@ class ControlPanel:
 
         except Exception as e:
             messagebox.showerror("Error", f"Could not start experiment: {str(e)}")
-            if self.temp_file:
-                self.temp_file.close()
-                try:
-                    os.unlink(self.temp_file.name)
-                except Exception:
-                    pass
-                self.temp_file = None
+            self.cleanup()
+            self.prober.resume()
             # If we yielded the outlet but failed to launch, reclaim it
             if self.capabilities['lsl'] and self._lsl_outlet is None:
-                self._create_lsl_outlet()
+                self._reclaim_lsl()
+
+    # ---- Warm worker ---------------------------------------------------- #
+    def _spawn_worker(self):
+        """Start a paradigm worker that imports everything and waits on stdin."""
+        if not self.panel_config.get('prewarm_worker', True):
+            return
+        if self._worker is not None and self._worker.poll() is None:
+            return
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        try:
+            self._worker = subprocess.Popen(
+                [sys.executable, os.path.join(script_dir, WORKER_SCRIPT)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                env=dict(os.environ, PYTHONUNBUFFERED='1')
+            )
+            print(f"ControlPanel: warm worker spawned (PID {self._worker.pid})")
+        except Exception as e:
+            self._worker = None
+            print(f"ControlPanel: could not spawn worker -> {e}")
+
+    def _start_in_worker(self, script_path, argv):
+        """Hand the session to the warm worker. Returns its process, or None
+        (no worker, or it died) so the caller launches cold."""
+        worker, self._worker = self._worker, None
+        if worker is None or worker.poll() is not None:
+            return None
+        try:
+            request = json.dumps({'script': script_path, 'argv': argv}) + '\n'
+            worker.stdin.write(request.encode('utf-8'))
+            worker.stdin.close()
+        except OSError as e:
+            print(f"ControlPanel: warm worker unusable ({e}); launching cold")
+            worker.kill()
+            return None
+        print(f"Process started in warm worker with PID: {worker.pid}")
+        return worker
+
+    def _kill_worker(self):
+        if self._worker is not None and self._worker.poll() is None:
+            try:
+                self._worker.stdin.close()      # worker exits on EOF
+                self._worker.wait(timeout=1)
+            except Exception:
+                self._worker.kill()
+        self._worker = None
+
+    # ---- Progress channel -------------------------------------------- #
+    def _open_progress_channel(self):
+        """Listen on a loopback port for the paradigm's progress stream.
+        Returns the tcp:// target for --progress_file, or None to fall back
+        to the temp file."""
+        if self.panel_config.get('progress_channel', 'socket') == 'file':
+            return None
+        try:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind((PROGRESS_HOST, 0))
+            server.listen(1)
+        except OSError as e:
+            print(f"ControlPanel: progress socket unavailable ({e}); using temp file")
+            return None
+        self._progress_server  = server
+        self._progress_updates = queue.Queue()     # nothing left over from the last run
+        threading.Thread(target=self._progress_reader, args=(server, self._progress_updates),
+                         name='progress-reader', daemon=True).start()
+        return f"tcp://{PROGRESS_HOST}:{server.getsockname()[1]}"
+
+    def _open_progress_wakeup(self):
+        """How the reader thread wakes the Tk loop once records are queued.
+        Where Tk has file handlers (POSIX) it writes a byte to a socketpair
+        Tk watches; otherwise it uses after_idle(), which threaded Tcl (the
+        Windows builds) runs on the Tk thread. Without either, the queue is
+        drained on the check_progress() tick."""
+        self._wake_pending = threading.Event()
+        self._wake_send    = None
+        self._wake_recv    = None
+        self._wake_idle    = False
+        if hasattr(self.root.tk, 'createfilehandler'):
+            self._wake_recv, self._wake_send = socket.socketpair()
+            self._wake_recv.setblocking(False)
+            self.root.tk.createfilehandler(self._wake_recv, tk.READABLE, self._on_progress_wake)
+        else:
+            try:
+                self._wake_idle = self.root.tk.eval('info exists tcl_platform(threaded)') == '1'
+            except tk.TclError:
+                pass
+        if self._wake_send is None and not self._wake_idle:
+            print("ControlPanel: no thread-safe Tk wake-up; progress is polled")
+
+    def _wake_progress(self):
+        """Reader thread: one wake-up per batch of queued records."""
+        if self._wake_pending.is_set():
+            return
+        self._wake_pending.set()
+        try:
+            if self._wake_send is not None:
+                self._wake_send.send(b'\0')
+            elif self._wake_idle:
+                self.root.after_idle(self._poll_progress)
+        except (OSError, RuntimeError, tk.TclError):
+            pass    # panel shutting down
+
+    def _on_progress_wake(self, fd, mask):
+        try:
+            while self._wake_recv.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        self._poll_progress()
+
+    def _progress_reader(self, server, updates):
+        """Reader thread: queue each record and wake the Tk loop; Tk itself is
+        only touched from the main thread."""
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return      # listener closed by cleanup()
+        with conn, conn.makefile('r', encoding='utf-8') as lines:
+            try:
+                for line in lines:
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        continue
+                    updates.put(data)
+                    self._wake_progress()
+            except OSError:
+                pass
+
+    def _poll_progress(self):
+        """Apply the newest progress record from the socket channel (Tk thread)."""
+        self._wake_pending.clear()      # before draining: later records wake again
+        data = None
+        try:
+            while True:
+                data = self._progress_updates.get_nowait()
+        except queue.Empty:
+            pass
+        if data is not None and not self.experiment_complete:
+            self._apply_progress(data)
+
+    def _apply_progress(self, data):
+        progress = data.get("progress", 0)
+        status   = data.get("status", "Running...")
+
+        if progress >= 99.9:
+            self.progress_var.set(100)
+            self.status_label.config(text="Completed")
+            self.percentage_label.config(text="100%")
+            self.start_button.state(['!disabled'])
+            self.experiment_dropdown.state(['!disabled'])
+            self.experiment_complete = True
+        else:
+            self.progress_var.set(progress)
+            self.status_label.config(text=status)
+            self.percentage_label.config(text=f"{progress}%")
 
     def check_progress(self):
-        """Poll the paradigm subprocess's progress file."""
+        """Watch for the paradigm subprocess exiting; in temp-file mode, also
+        poll its progress file. Socket-channel records are applied as they
+        arrive (see _open_progress_wakeup); draining here as well only covers
+        a Tk without a thread-safe wake-up."""
+        self._refresh_log_label()
+        self._poll_capabilities()
+        self._poll_progress()
         if self.process:
             returncode = self.process.poll()
 
-            if returncode is not None:
+            # Teardown runs once per session, also when the paradigm already
+            # reported 100% and was then closed from its blank screen
+            if returncode is not None and self._session_open:
+                self._session_open = False
+                print(f"Process ended with code: {returncode}")
+                self.cleanup()
+                self.session_log.close()
+                self._refresh_log_label()
                 if not self.experiment_complete:
-                    print(f"Process ended with code: {returncode}")
-                    self.cleanup()
                     self.progress_var.set(100)
                     self.status_label.config(text="Completed (Window still open)")
                     self.percentage_label.config(text="100%")
                     self.start_button.state(['!disabled'])
                     self.experiment_dropdown.state(['!disabled'])
                     self.experiment_complete = True
-                    # Subprocess has released its LSL outlet by exiting;
-                    # bring our placeholder back up so NIRStar can latch on.
-                    if self.capabilities['lsl']:
-                        # Small additional grace period before reclaiming
-                        self.root.after(int(LSL_HANDOFF_DELAY_S * 1000),
-                                        self._create_lsl_outlet)
-            else:
+                # Subprocess has released its LSL outlet by exiting;
+                # bring our placeholder back up so NIRStar can latch on.
+                if self.capabilities['lsl']:
+                    # Small additional grace period before reclaiming
+                    self.root.after(int(LSL_HANDOFF_DELAY_S * 1000), self._reclaim_lsl)
+                if self._lsl_relay is not None:
+                    print(self._lsl_relay.summary())
+                # Hardware is free again; fresh interpreter for the next session
+                self.prober.resume()
+                self.root.after(WORKER_RESPAWN_MS, self._spawn_worker)
+            elif returncode is None and self.temp_file:
                 try:
-                    with open(self.temp_file.name, 'r') as f:
-                        data = json.load(f)
-                        progress = data.get("progress", 0)
-                        status   = data.get("status", "Running...")
-
-                        if progress >= 99.9:
-                            self.progress_var.set(100)
-                            self.status_label.config(text="Completed")
-                            self.percentage_label.config(text="100%")
-                            self.start_button.state(['!disabled'])
-                            self.experiment_dropdown.state(['!disabled'])
-                            self.experiment_complete = True
-                        else:
-                            self.progress_var.set(progress)
-                            self.status_label.config(text=status)
-                            self.percentage_label.config(text=f"{progress}%")
+                    with open(self.temp_file, 'r') as f:
+                        self._apply_progress(json.load(f))
                 except Exception:
-                    # Progress-file write race / transient — ignore and retry
+                    # Progress file replaced mid-open / transient — retry
                     pass
 
-        self.root.after(100, self.check_progress)
+        self.root.after(100 if self.temp_file else 250, self.check_progress)
+
+    # ---- Session log --------------------------------------------------- #
+    def _refresh_log_label(self):
+        if not self.session_log:
+            return
+        lines, errors, _ = self.session_log.snapshot()
+        if (lines, errors) == self._log_counts:
+            return
+        self._log_counts = (lines, errors)
+        self.log_label.config(text=f"Log: {lines} lines, {errors} errors",
+                              foreground=COLOR_DEAD if errors else "#555555")
+
+    def show_session_log(self):
+        """Last SESSION_LOG_TAIL lines of the current (or last) run."""
+        if not self.session_log:
+            messagebox.showinfo("Session log", "No experiment has been run yet.")
+            return
+        _, _, tail = self.session_log.snapshot()
+        window = tk.Toplevel(self.root)
+        window.title(f"Session log — {os.path.basename(self.session_log.path or '')}")
+        text = tk.Text(window, width=100, height=30, font=("Courier", 9), wrap="none")
+        scroll = ttk.Scrollbar(window, command=text.yview)
+        text.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        text.pack(fill="both", expand=True)
+        text.insert("end", "\n".join(tail))
+        text.see("end")
+        text.configure(state="disabled")
 
     # ---- Cleanup ------------------------------------------------------- #
     def cleanup(self):
-        if self.temp_file:
+        if self._progress_server:
             try:
-                self.temp_file.close()
-                os.unlink(self.temp_file.name)
-            except Exception as e:
-                print(f"Cleanup error: {str(e)}")
+                self._progress_server.close()
+            except OSError:
+                pass
+            self._progress_server = None
+        if self.temp_file:
+            # The progress file and any temp copy a failed replace left behind
+            for path in (self.temp_file, self.temp_file + '.tmp'):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    print(f"Cleanup error: {str(e)}")
             self.temp_file = None
 
     def __del__(self):
         self.cleanup()
+        self._kill_worker()
         self._destroy_lsl_outlet()
         if self.process and self.process.poll() is None:
             self.process.terminate()
@@ -669,6 +1354,12 @@ def main():
 
     def on_closing():
         app.cleanup()
+        if app._wake_recv is not None:
+            root.tk.deletefilehandler(app._wake_recv)
+        app._kill_worker()
+        app.prober.stop()
+        if app._lsl_relay is not None:
+            app._lsl_relay.close()
         app._destroy_lsl_outlet()
         root.destroy()
 
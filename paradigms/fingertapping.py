@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import pygame, sys, os, json, argparse
+import sys, os, json, argparse
 from pathlib import Path
 
 # Import shared utilities and the unified trigger dispatcher
@@ -8,8 +8,12 @@ script_dir = Path(__file__).resolve().parent
 parent_dir = script_dir.parent
 sys.path.insert(0, str(parent_dir))
 from auxfunc.paradigm_utils import (
-    update_progress, check_for_quit, display_message, play_audio, TriggerManager, resolve_display, load_strings
+    update_progress, display_message, play_audio, TriggerManager, resolve_display, load_strings,
+    clear_screen, assets, wait_for_event, capture, use_headless, now, frames, session_output_dir,
+    clock_sync, init_pygame, startup, write_session_diagnostics
 )
+import pygame       # first imported (and timed) by paradigm_utils
+startup.mark('imports')
 
 
 # Default keystroke fallback targets. Overridable per-paradigm via
@@ -66,10 +70,18 @@ def parse_arguments():
                         help='Experiment profile to use')
     parser.add_argument('--use_lsl', action='store_true',
                         help='Open the LSL marker stream (used as fallback if TTL unavailable)')
+    parser.add_argument('--lsl_relay', default=None,
+                        help="udp://host:port of the control panel's LSL relay (it keeps the outlet)")
     parser.add_argument('--use_sound', action='store_true',
                         help='Enable beep sounds')
     parser.add_argument('--language', default='en',
                         help="UI language code from configs/strings.json (e.g. 'en', 'es')")
+    parser.add_argument('--frame_timing', action='store_true',
+                        help='Record per-frame timing; summary per phase, CSV next to the results')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run on SDL dummy video/audio drivers with Win32 calls stubbed out')
+    parser.add_argument('--virtual_clock', action='store_true',
+                        help='Headless run on simulated time (a full profile in seconds)')
     return parser.parse_args()
 
 
@@ -77,6 +89,8 @@ def main():
     # Setup paradigm
     args = parse_arguments()
     settings, profile = load_config_profile(args.profile)
+    if args.headless or args.virtual_clock:
+        use_headless(virtual_clock=args.virtual_clock)
 
     # Load the language pack for this run (overlays built-in English fallbacks)
     global STRINGS
@@ -104,23 +118,33 @@ def main():
     print(f"Debug: Language: {args.language}")
 
     # Initialize unified trigger dispatcher (cascade: TTL -> LSL -> keystrokes)
-    trigger = TriggerManager(use_lsl=args.use_lsl, programs=keystroke_programs)
+    # Synchronous unless the profile opts in ("async_triggers": true), in which
+    # case send() returns at once and delivery runs off the frame loop
+    trigger = TriggerManager(use_lsl=args.use_lsl, programs=keystroke_programs,
+                             async_dispatch=profile.get('async_triggers', False),
+                             lsl_relay=args.lsl_relay)
 
     try:
-        # Initialize pygame
-        pygame.mixer.init()
-        pygame.init()
+        # Initialize pygame (display, font, timer, mixer only)
+        init_pygame(audio=True)
         pygame.display.set_caption(window_name)
 
-        audio_path    = Path(os.path.dirname(os.path.abspath(__file__))) / '_resources'
         screen = pygame.display.set_mode((width_screen, height_screen), display=display_idx)
         font          = pygame.font.SysFont(None, 120)
+        startup.mark('window open')
+        if args.frame_timing:
+            frames.enable(budget_ms=1000 / display_config.get('refresh_hz', 60))
+        capture.configure()     # only quit / key / window events reach the queue
 
-        # Lobby 01: Welcome screen
-        screen.fill((0, 0, 0))
+        # Lobby 01: Welcome screen, up before anything else loads
         display_message(screen, font, txt('intro'),
                         width_screen=width_screen, height_screen=height_screen)
-        pygame.display.flip()
+
+        # Decode every cue sound this profile uses before anything is timed
+        assets.preload_profile(profile)
+        startup.mark('assets loaded')
+        startup.report()
+        clock_sync.sample("start")
 
         if args.progress_file:
             active = trigger.status()['active_method'].upper()
@@ -128,26 +152,15 @@ def main():
                             f"Setup complete ({active}). Press 'W' to continue...")
 
         # Enter waiting room
-        waiting = True
-        while waiting:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    return
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_w:
-                        waiting = False
-                    if event.key == pygame.K_c and (pygame.key.get_mods() & pygame.KMOD_CTRL):
-                        return
-
-        screen.fill((0, 0, 0))
-        pygame.display.flip()
+        if wait_for_event(keys=(pygame.K_w,)) == 'quit':
+            return
 
         # Resting state
-        screen.fill((0, 0, 0))
+        frames.phase = "resting state"
         display_message(screen, font, "+",
-                        width_screen=width_screen, height_screen=height_screen)
-        pygame.display.flip()
-        trigger.send(value=8, return_focus_to=window_name)
+                        width_screen=width_screen, height_screen=height_screen,
+                        on_shown=lambda t: trigger.send(value=8, return_focus_to=window_name,
+                                                        label="resting state start", timestamp=t))
 
         if args.progress_file:
             update_progress(args.progress_file, 5, "Initial resting state.")
@@ -161,25 +174,23 @@ def main():
                            height_screen=height_screen):
             return
 
-        trigger.send(value=8, return_focus_to=window_name)
+        trigger.send(value=8, return_focus_to=window_name, label="resting state end")
+        frames.block_summary("resting state")
 
         # Initial 3-second countdown
+        frames.phase = "countdown"
         for i in range(3, 0, -1):
-            screen.fill((0, 0, 0))
             display_message(screen, font, txt('countdown').format(n=i),
                             width_screen=width_screen, height_screen=height_screen)
-            pygame.display.flip()
-            if play_audio(audio_path / f'countdown_{i}.mp3'):
+            if play_audio(assets.sound(f'countdown_{i}.mp3')):
                 return
-            pygame.time.wait(1000)
-            if check_for_quit():
+            if wait_for_event(timeout_ms=1000) == 'quit':
                 return
 
         if args.progress_file:
             update_progress(args.progress_file, 10, "Beginning exercise sequence...")
 
-        screen.fill((0, 0, 0))
-        pygame.display.flip()
+        clear_screen(screen)
 
         # Exercise sequence
         progress_per_rep = 99 / len(repetitions)
@@ -192,18 +203,22 @@ def main():
                 update_progress(args.progress_file, base_progress,
                                 f"Exercise {direction.upper()} ({rep_idx+1}/{len(repetitions)})")
 
-            trigger.send(value=8, return_focus_to=window_name)
+            frames.phase = f"tapping {direction} ({rep_idx+1})"
 
+            # Phase marker stamped with the flip that shows the cue
             if display_message(screen, font, direction.upper(), task_duration, custom_font_size=300,
                                progress_file=args.progress_file,
                                status=f"Fingertapping {direction.upper()} ({rep_idx+1}/{len(repetitions)})",
                                progress_start=base_progress,
                                progress_end=base_progress + (progress_per_rep * 0.5),
                                width_screen=width_screen,
-                               height_screen=height_screen):
+                               height_screen=height_screen,
+                               on_shown=lambda t: trigger.send(value=8, return_focus_to=window_name,
+                                                               label=f"tapping {direction} ({rep_idx+1})",
+                                                               timestamp=t)):
                 return
 
-            if play_audio(str(audio_path / f"{direction.upper()}.mp3")):
+            if play_audio(assets.sound(f"{direction.upper()}.mp3")):
                 return
 
             # ========== REST PHASE ==========
@@ -212,7 +227,7 @@ def main():
                 update_progress(args.progress_file, rest_progress,
                                 f"Resting after {direction.upper()} ({rep_idx+1}/{len(repetitions)})")
 
-            trigger.send(value=8, return_focus_to=window_name)
+            frames.phase = f"rest after {direction} ({rep_idx+1})"
 
             if display_message(screen, font, "", rest_duration, custom_font_size=300,
                                progress_file=args.progress_file,
@@ -220,38 +235,42 @@ def main():
                                progress_start=rest_progress,
                                progress_end=base_progress + progress_per_rep,
                                width_screen=width_screen,
-                               height_screen=height_screen):
+                               height_screen=height_screen,
+                               on_shown=lambda t: trigger.send(value=8, return_focus_to=window_name,
+                                                               label=f"rest after {direction} ({rep_idx+1})",
+                                                               timestamp=t)):
                 return
 
-            if play_audio(str(audio_path / "STOP.mp3")):
+            if play_audio(assets.sound("STOP.mp3")):
                 return
+            frames.block_summary(f"repetition {rep_idx+1} ({direction})")
+            clock_sync.sample(f"repetition {rep_idx+1}")
 
         # Terminate
         if args.progress_file:
             update_progress(args.progress_file, 95, "Sequence complete")
 
-        screen.fill((0, 0, 0))
         _complete = txt('complete')
         display_message(screen, font, _complete[0],
                         width_screen=width_screen, height_screen=height_screen)
         display_message(screen, font, _complete[1] if len(_complete) > 1 else "",
                         position=(width_screen // 2, height_screen // 2 + 80),
                         width_screen=width_screen, height_screen=height_screen)
-        pygame.display.flip()
-        pygame.time.wait(standby_duration)
+        if wait_for_event(timeout_ms=standby_duration) == 'quit':
+            return
 
         if args.progress_file:
             active = trigger.status()['active_method'].upper()
             update_progress(args.progress_file, 100, f"Complete ({active})")
 
-        screen.fill((0, 0, 0))
-        pygame.display.flip()
-
-        while True:
-            if check_for_quit():
-                return
+        clear_screen(screen)
+        wait_for_event()    # blank until the operator quits
     finally:
-        trigger.close()
+        output_dir = session_output_dir(settings.get('paths', {}).get('project_root', ''),
+                                        args.subject_id)
+        write_session_diagnostics(output_dir, args.subject_id, profile.get('appendix', ''), trigger)
+        if args.virtual_clock:
+            print(f"Virtual clock: {now():.1f} s of session time simulated")
 
 
 if __name__ == "__main__":
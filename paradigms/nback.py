@@ -1,8 +1,7 @@
-# Import dependencies
-import numpy as np
-import pandas as pd
+# Import dependencies (pandas is imported lazily, see results_frame)
 from pathlib import Path
-import sys, pygame, json, os, win32gui, random, re, argparse
+import sys, json, os, random, argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # Import shared utilities and the unified trigger dispatcher
 script_dir = Path(__file__).resolve().parent
@@ -10,8 +9,13 @@ parent_dir = script_dir.parent
 sys.path.insert(0, str(parent_dir))
 
 from auxfunc.paradigm_utils import (
-    update_progress, check_for_quit, display_message, ensure_window_focus, play_audio, TriggerManager, resolve_display, load_strings
+    update_progress, display_message, ensure_window_focus, play_audio, TriggerManager, resolve_display, load_strings,
+    glyphs, get_scene, clear_screen, outline_surface, now, assets, wait_for_event, focus,
+    capture, find_window, use_headless, frames, session_output_dir, clock_sync,
+    init_pygame, startup, write_session_diagnostics
 )
+import pygame       # first imported (and timed) by paradigm_utils
+startup.mark('imports')
 
 
 # Default keystroke fallback targets. Overridable per-paradigm via
@@ -87,9 +91,8 @@ def txt(key):
 
 
 # Set up pygame
-def init_game(settings, profile):
-    pygame.init()
-
+def init_game(settings, profile, use_sound=False):
+    init_pygame(audio=use_sound)
 
     display_config = settings.get('display', {})
     display_idx, width_screen, height_screen = resolve_display(
@@ -103,6 +106,7 @@ def init_game(settings, profile):
     screen = pygame.display.set_mode((width_screen, height_screen), display=display_idx)
     clock  = pygame.time.Clock()
     font   = pygame.font.SysFont(None, 120)
+    startup.mark('window open')
 
     return screen, clock, font, width_screen, height_screen, window_name
 
@@ -118,8 +122,6 @@ def get_instructions(stim_type):
 def run_rest_states(screen, font, rest_states, rest_period, instruction_time, window_name,
                     width_screen, height_screen, trigger, progress_file=None, use_sound=True):
 
-    audio_path = Path(os.path.dirname(os.path.abspath(__file__))) / '_resources'
-
     # rest_period may be a single value (same length for every state) or a list
     # aligned positionally with rest_states (e.g. ["closed","open"] -> [180000, 90000]).
     if isinstance(rest_period, (list, tuple)):
@@ -141,6 +143,7 @@ def run_rest_states(screen, font, rest_states, rest_period, instruction_time, wi
 
         instruction_msg = txt('rest_closed') if state == 'closed' else txt('rest_open')
         rest_display    = "" if state == 'closed' else "+"
+        frames.phase    = f"rest {enum+1} ({state})"
 
         if display_message(screen, font, instruction_msg, instruction_time,
                            progress_file=progress_file,
@@ -151,37 +154,82 @@ def run_rest_states(screen, font, rest_states, rest_period, instruction_time, wi
                            height_screen=height_screen):
             return True
 
-        trigger.send(value=8, return_focus_to=window_name)
-
+        # Marker stamped with the flip that starts the rest display
         if display_message(screen, font, rest_display, periods[enum], custom_font_size=300,
                            progress_file=progress_file,
                            status=f"Rest state {enum+1}: in progress (eyes {state})",
                            progress_start=20,
                            progress_end=99,
                            width_screen=width_screen,
-                           height_screen=height_screen):
+                           height_screen=height_screen,
+                           on_shown=lambda t: trigger.send(value=8, return_focus_to=window_name,
+                                                           label=f"rest {enum+1} ({state})",
+                                                           timestamp=t)):
             return True
 
         if use_sound:
-            play_audio(audio_path / 'beep.mp3')
+            play_audio(assets.sound('beep.mp3'))
+        frames.block_summary(f"rest {enum+1} ({state})")
 
     if progress_file:
         update_progress(progress_file, 0, "Rest states complete. Proceeding to task.")
     return False
 
 
+def build_block_schedule(n_trials, stim_time, cooldown_time, seed):
+    """Precompute a block's timeline from `seed`: one (planned onset, duration)
+    pair per trial, in ms from block onset, with the usual 0.9-1.1 jitter on
+    stimulus + cooldown. The same seed always yields the same schedule."""
+    rng      = random.Random(seed)
+    schedule = []
+    onset    = 0.0
+    for _ in range(n_trials):
+        duration = rng.uniform(0.9, 1.1) * (stim_time + cooldown_time)
+        schedule.append((onset, duration))
+        onset += duration
+    return schedule
+
+
+# Interim CSV snapshots are written off the main thread so a slow disk never
+# holds up the frame loop (and with it, input pumping).
+_interim_writer = ThreadPoolExecutor(max_workers=1)
+
+
 def run_trials(screen, font, stimulus, stim_type, settings, profile, width_screen, height_screen,
                window_name, trigger, progress_file=None, subject_id=None):
 
-    pygame_hwnd      = win32gui.FindWindow(None, window_name)
     instruction_time = profile.get('instructions',       10000)
     stim_time        = profile.get('stim_presentation',    500)
     cooldown_time    = profile.get('stim_cooldown',       1500)
     project_root     = settings.get('paths', {}).get('project_root', '')
+    session_seed     = profile.get('seed', random.SystemRandom().randrange(2**32))
+    print(f"Schedule seed: {session_seed}")
 
     # -- Initialize output storage variables
     temp_st, temp_sm, temp_er, temp_ar, temp_rt, temp_offset = [], [], [], [], [], []
-    results_df = pd.DataFrame()
+    temp_on, temp_off = [], []
+    temp_fl, temp_fms = [], []
+    temp_all = []
+    temp_lag = []
+    temp_seed = []
+    columns = {
+        'StimulusType'    : temp_st,
+        'Stimulus'        : temp_sm,
+        'ExpectedResponse': temp_er,
+        'ActualResponse'  : temp_ar,
+        'ReactionTime'    : temp_rt,
+        'Responses'       : temp_all,
+        'StimOffset'      : temp_offset,     # planned onset, ms from block onset
+        'FlipOnsetMs'     : temp_on,         # measured, same origin as StimOffset
+        'FlipOffsetMs'    : temp_off,
+        'OnsetLagMs'      : temp_lag,
+        'FocusLosses'     : temp_fl,
+        'FocusLostMs'     : temp_fms,
+        'ScheduleSeed'    : temp_seed,
+    }
+
+    def snapshot():
+        return {name: list(values) for name, values in columns.items()}
 
     # -- Get the appropriate instructions based on the stimulus type
     instructions = get_instructions(profile.get("stim_type", ""))
@@ -198,6 +246,8 @@ def run_trials(screen, font, stimulus, stim_type, settings, profile, width_scree
                             (height_screen - rect_size) // 2,
                             rect_size, rect_size)
     rectangle.center = (width_screen // 2, height_screen // 2)
+    border = outline_surface(rectangle.size)
+    scene  = get_scene(screen)
 
     # -- Iterate through stimuli
     for i, trial_type in enumerate(stim_type):
@@ -217,6 +267,7 @@ def run_trials(screen, font, stimulus, stim_type, settings, profile, width_scree
         # Display instruction screen (takes 10% of this trial type's progress)
         instr_progress_start = progress_start
         instr_progress_end   = progress_start + (progress_per_trial_type * 0.1)
+        frames.phase         = f"{trial_type} instructions"
 
         if display_message(screen, font, instructions[i], instruction_time,
                            progress_file=progress_file,
@@ -226,12 +277,19 @@ def run_trials(screen, font, stimulus, stim_type, settings, profile, width_scree
                            image_path=image_path,
                            width_screen=width_screen,
                            height_screen=height_screen):
-            return results_df
+            return results_frame(snapshot())
 
         # Set response
         response = stimulus[f"{trial_type}-response"]
-        # Block-onset marker
-        trigger.send(value=8, return_focus_to=window_name)
+        # Keystroke markers move focus around, so they go out (and finish)
+        # before the block starts; TTL/LSL go out with the first stimulus
+        # flip, stamped with it.
+        key_trigger = None
+        if trigger.has_slow():
+            key_trigger = trigger.send(value=8, return_focus_to=window_name,
+                                       label=f"{trial_type} onset", lane='slow')
+            key_trigger.wait()
+        onset_trigger = None
 
         # Stimuli take remaining 90% of this trial type's progress
         stimuli_progress_start = instr_progress_end
@@ -239,7 +297,19 @@ def run_trials(screen, font, stimulus, stim_type, settings, profile, width_scree
 
         stim_count        = len(stimulus[trial_type])
         progress_per_stim = (stimuli_progress_end - stimuli_progress_start) / stim_count if stim_count > 0 else 0
-        stim_offset       = 0
+        schedule          = build_block_schedule(stim_count, stim_time, cooldown_time,
+                                                 f"{session_seed}:{trial_type}")
+        scene.show([('border', border, rectangle, 'border')])
+
+        # Rasterize every stimulus of this block before the clock starts; the
+        # frame loop below only blits.
+        glyphs.preload(str(s) for s in stimulus[trial_type])
+        glyph_misses = glyphs.misses
+        focus.reset_block()
+
+        # The block clock starts now, right before the first deadline; flip
+        # onsets/offsets are logged relative to it
+        block_onset = now()
 
         for idx, (stim, resp) in enumerate(zip(stimulus[trial_type], response)):
             stim_progress_start = stimuli_progress_start + (idx       * progress_per_stim)
@@ -249,102 +319,146 @@ def run_trials(screen, font, stimulus, stim_type, settings, profile, width_scree
                 update_progress(progress_file, stim_progress_start,
                                 f"Processing stimulus {idx+1}/{stim_count} in {i}")
 
-            start_time  = pygame.time.get_ticks()
+            # Absolute deadlines from block onset: a late trial eats into its
+            # own fixation instead of pushing every later trial back
+            planned_onset, total_duration = schedule[idx]
+            start_time  = block_onset + planned_onset / 1000
+            trial_end   = start_time + total_duration / 1000
             key_pressed = None
-            timepressed = np.inf
+            timepressed = float('inf')
+            responses   = []       # every (key, rt) in this trial, not just the first
+            flip_onset  = None     # now() of the flip that showed the stimulus
+            flip_offset = None     # now() of the flip that removed it
 
             # Progress tracking variables
-            last_update_time = start_time
+            last_update_time = now()
             update_interval  = 50
 
-            temp_offset.append(stim_offset)
-            woodpecker     = random.uniform(0.9, 1.1)
-            total_duration = woodpecker * (stim_time + cooldown_time)
-            stim_offset   += total_duration
+            temp_offset.append(planned_onset)
 
-            while pygame.time.get_ticks() - start_time < total_duration:
-                ensure_window_focus(pygame_hwnd)
+            focus_losses, focus_lost = focus.stats()
+            frames.phase = f"{trial_type} trial {idx+1}"
+            stim_text = glyphs.get(str(stim))
+            stim_rect = stim_text.get_rect(center=(width_screen // 2, height_screen // 2))
+            # With no cooldown the previous (possibly identical) stimulus is
+            # still up; repaint it so this trial's onset gets its own flip
+            scene.touch('stimulus')
 
-                current_time      = pygame.time.get_ticks() - start_time
-                is_stimulus_phase = current_time < stim_time
+            while True:
+                focus.poll()
 
-                screen.fill((0, 0, 0))
-                pygame.draw.rect(screen, (255, 255, 255), rectangle, 2)
+                t = now()
+                if t >= trial_end:
+                    break
+                current_time = (t - start_time) * 1000
+                # The stimulus stays up for stim_time from its measured onset
+                is_stimulus_phase = flip_onset is None or (t - flip_onset) * 1000 < stim_time
 
+                # Only the stimulus on/off transitions touch the display
                 if is_stimulus_phase:
-                    stim_font = pygame.font.SysFont(None, 300)
-                    text = stim_font.render(str(stim), True, (255, 255, 255))
-                    rect = text.get_rect(center=(width_screen // 2, height_screen // 2))
-                    screen.blit(text, rect)
+                    scene.set('stimulus', stim_text, stim_rect)
+                else:
+                    scene.remove('stimulus')
+                if scene.present():
+                    if is_stimulus_phase and flip_onset is None:
+                        flip_onset = scene.last_flip
+                        if onset_trigger is None:
+                            onset_trigger = trigger.send(value=8, label=f"{trial_type} onset",
+                                                         timestamp=flip_onset, lane='fast')
+                        # Never cut a stimulus short, however late it went up
+                        trial_end  = max(trial_end, flip_onset + stim_time / 1000)
+                    elif not is_stimulus_phase and flip_onset is not None and flip_offset is None:
+                        flip_offset = scene.last_flip
+
+                # Sleep until the next stimulus change or progress update; a key
+                # press wakes this immediately and is stamped as it arrives
+                if not is_stimulus_phase:
+                    next_change = trial_end
+                elif flip_onset is not None:
+                    next_change = flip_onset + stim_time / 1000
                 else:
-                    fix_font = pygame.font.SysFont(None, 300)
-                    text = fix_font.render("", True, (255, 255, 255))
-                    rect = text.get_rect(center=(width_screen // 2, height_screen // 2))
-                    screen.blit(text, rect)
-
-                pygame.display.flip()
-
-                # Check for events
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        return results_df
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_c and (pygame.key.get_mods() & pygame.KMOD_CTRL):
-                            return results_df
-                        elif key_pressed is None:
-                            key_pressed = event.key
-                            timepressed = current_time / 1000
+                    # No onset flip yet: fall back to the planned deadline
+                    planned_end = start_time + stim_time / 1000
+                    next_change = planned_end if planned_end > now() else trial_end
+                capture.pump(min((next_change - now()) * 1000, update_interval))
+                for stamp, etype, key, mod in capture.drain():
+                    if etype == pygame.QUIT:
+                        return results_frame(snapshot())
+                    if key == pygame.K_c and (mod & pygame.KMOD_CTRL):
+                        return results_frame(snapshot())
+                    # RT relative to the measured onset flip
+                    rt = stamp - (flip_onset if flip_onset is not None else start_time)
+                    responses.append((key, rt))
+                    if key_pressed is None:
+                        key_pressed = key
+                        timepressed = rt
 
                 # Update progress at most every 50ms
-                current_update_time = pygame.time.get_ticks()
-                if progress_file and (current_update_time - last_update_time >= update_interval):
-                    progress_percent = stim_progress_start + (current_time / total_duration) * (stim_progress_end - stim_progress_start)
+                current_update_time = now()
+                if progress_file and (current_update_time - last_update_time) * 1000 >= update_interval:
+                    progress_percent = stim_progress_start + min(current_time / total_duration, 1) * (stim_progress_end - stim_progress_start)
                     phase_name = "Stimulus" if is_stimulus_phase else "Fixation"
                     update_progress(progress_file, progress_percent,
                                     f"{phase_name} {idx+1}/{stim_count} in {i}")
                     last_update_time = current_update_time
 
-                pygame.time.wait(10)
-
             print(f"Key pressed: {key_pressed} @{timepressed}")
             temp_st.append(i)
             temp_sm.append(stim)
             temp_er.append(resp)
             temp_ar.append(key_pressed)
             temp_rt.append(timepressed)
+            temp_all.append(';'.join(f"{k}:{t:.4f}" for k, t in responses))
+            temp_on.append(round((flip_onset - block_onset) * 1000, 3) if flip_onset is not None else float('nan'))
+            temp_off.append(round((flip_offset - block_onset) * 1000, 3) if flip_offset is not None else float('nan'))
+            temp_lag.append(round((flip_onset - start_time) * 1000, 3) if flip_onset is not None else float('nan'))
+            losses, lost = focus.stats()
+            temp_fl.append(losses - focus_losses)
+            temp_fms.append(round((lost - focus_lost) * 1000, 1))
+            temp_seed.append(session_seed)
 
-            results_df = pd.DataFrame({
-                'StimulusType'    : temp_st,
-                'Stimulus'        : temp_sm,
-                'ExpectedResponse': temp_er,
-                'ActualResponse'  : temp_ar,
-                'ReactionTime'    : temp_rt,
-                'StimOffset'      : temp_offset
-            })
 
             # Save interim results if subject_id is provided
             if subject_id and subject_id != "UNKNOWN" and profile:
-                save_results(results_df, Path(project_root), subject_id,
-                             profile.get("appendix", ""), interim=True)
+                # DataFrame is built on the writer thread, not between trials
+                _interim_writer.submit(lambda rows: save_results(results_frame(rows), Path(project_root), subject_id,
+                                                                 profile.get("appendix", ""), interim=True),
+                                       snapshot())
+
+        print(f"GlyphCache: {glyphs.misses - glyph_misses} mid-block rasterizations "
+              f"in {trial_type} ({glyphs.stats()})")
+        print(f"InputCapture: {capture.stats()}")
+        losses, lost = focus.stats()
+        print(f"Focus: lost {losses}x for {lost * 1000:.0f} ms in {trial_type} "
+              f"({focus.attempts} re-focus attempts)")
+        frames.block_summary(trial_type)
+        clock_sync.sample(trial_type)
+        sent = [h for h in (key_trigger, onset_trigger) if h is not None and h.records]
+        if sent:
+            latency = {t: ms for h in sent for t, ms in h.latency_ms().items()}
+            print(f"Trigger: {trial_type} onset delivery latency (ms): "
+                  f"{latency or 'no transport fired'}")
 
         if progress_file:
             update_progress(progress_file, progress_end,
                             f"Completed trial block: {i+1}/{len(stim_type)}")
 
-    return results_df
+    return results_frame(snapshot())
+
+
+def results_frame(columns):
+    """Results table as a DataFrame. pandas is imported here rather than at
+    startup; by the time results exist the stimulus table has loaded it."""
+    return startup.import_module('pandas').DataFrame(columns)
 
 
 def save_results(results, save_path, subject_id, profile_appendix="", interim=False):
     """Save results using the appropriate method for the experiment profile"""
-    if results.empty or subject_id == "UNKNOWN":
+    if results.empty:
         return False
 
-    match = re.match(r'^([A-Za-z]+)', subject_id)
-    if match:
-        project = match.group(1)
-        project_dir = os.path.join(save_path, project)
-        os.makedirs(project_dir, exist_ok=True)
-
+    project_dir = session_output_dir(save_path, subject_id)
+    if project_dir:
         if interim:
             filename = f"{subject_id}_interim{profile_appendix}.csv"
         else:
@@ -369,10 +483,18 @@ def parse_arguments():
                         help='Experiment profile to use')
     parser.add_argument('--use_lsl', action='store_true',
                         help='Open the LSL marker stream (used as fallback if TTL unavailable)')
+    parser.add_argument('--lsl_relay', default=None,
+                        help="udp://host:port of the control panel's LSL relay (it keeps the outlet)")
     parser.add_argument('--use_sound', action='store_true',
                         help='Enable beep sounds')
     parser.add_argument('--language', default='en',
                         help="UI language code from configs/strings.json (e.g. 'en', 'es')")
+    parser.add_argument('--frame_timing', action='store_true',
+                        help='Record per-frame timing; summary per block, CSV next to the results')
+    parser.add_argument('--headless', action='store_true',
+                        help='Run on SDL dummy video/audio drivers with Win32 calls stubbed out')
+    parser.add_argument('--virtual_clock', action='store_true',
+                        help='Headless run on simulated time (a full profile in seconds)')
     return parser.parse_args()
 
 
@@ -380,6 +502,8 @@ def main():
     # Parse command line arguments, load settings / profile
     args = parse_arguments()
     settings, profile = load_config_profile(args.profile)
+    if args.headless or args.virtual_clock:
+        use_headless(virtual_clock=args.virtual_clock)
 
     # Load the language pack for this run (overlays the built-in English fallbacks)
     global STRINGS
@@ -395,16 +519,33 @@ def main():
     keystroke_programs = profile.get('keystroke_programs', DEFAULT_KEYSTROKE_PROGRAMS)
 
     # Initialize unified trigger dispatcher (cascade: TTL -> LSL -> keystrokes)
-    trigger = TriggerManager(use_lsl=args.use_lsl, programs=keystroke_programs)
+    # Synchronous unless the profile opts in ("async_triggers": true), in which
+    # case send() returns at once and delivery runs off the frame loop
+    trigger = TriggerManager(use_lsl=args.use_lsl, programs=keystroke_programs,
+                             async_dispatch=profile.get('async_triggers', False),
+                             lsl_relay=args.lsl_relay)
 
     try:
         # Initialize pygame
-        screen, clock, font, width_screen, height_screen, window_name = init_game(settings, profile)
-
-        stim_root   = Path(os.path.dirname(os.path.abspath(__file__))) / '_resources'
-        stimulus    = pd.read_csv(stim_root / profile["stim_type"])
+        screen, clock, font, width_screen, height_screen, window_name = init_game(
+            settings, profile, use_sound=args.use_sound)
+        if args.frame_timing:
+            frames.enable(budget_ms=1000 / settings.get('display', {}).get('refresh_hz', 60))
+
+        # Waiting room #1 goes up first; everything below loads behind it
+        display_message(screen, font, txt('intro'),
+                        width_screen=width_screen, height_screen=height_screen)
+
+        # Load + convert every resource this profile uses before anything is timed
+        assets.preload_profile(profile)
+        startup.mark('assets loaded')
+        startup.report()
+        clock_sync.sample("start")
+        stimulus    = assets.table(profile["stim_type"])
         stim_type   = [col for col in stimulus.columns if not col.endswith('response')]
-        pygame_hwnd = win32gui.FindWindow(None, window_name)
+        pygame_hwnd = find_window(window_name)
+        focus.attach_window(window_name)
+        capture.configure()
 
         # Initialize progress file
         if args.progress_file:
@@ -417,23 +558,10 @@ def main():
 
         # Enter waiting room #1
         ensure_window_focus(pygame_hwnd)
-        waiting = True
-        while waiting:
-            clock.tick(60)
-            display_message(screen, font, txt('intro'),
-                            width_screen=width_screen, height_screen=height_screen)
-
-            if args.progress_file:
-                update_progress(args.progress_file, 0, "Press 'W' to continue...")
-
-            if check_for_quit():
-                return
-
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_w]:
-                waiting = False
-
-            pygame.time.wait(50)
+        if args.progress_file:
+            update_progress(args.progress_file, 0, "Press 'W' to continue...")
+        if wait_for_event(keys=(pygame.K_w,)) == 'quit':
+            return
 
         # Enter rest state(s)
         if run_rest_states(screen, font, profile["rest_states"], profile["rest_period"],
@@ -443,23 +571,12 @@ def main():
 
         # Enter waiting room #2
         ensure_window_focus(pygame_hwnd)
-        waiting = True
-        while waiting:
-            clock.tick(60)
-            display_message(screen, font, txt('postrest'),
-                            width_screen=width_screen, height_screen=height_screen)
-
-            if args.progress_file:
-                update_progress(args.progress_file, 0, "Press 'W' to continue...")
-
-            if check_for_quit():
-                return
-
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_w]:
-                waiting = False
-
-            pygame.time.wait(50)
+        display_message(screen, font, txt('postrest'),
+                        width_screen=width_screen, height_screen=height_screen)
+        if args.progress_file:
+            update_progress(args.progress_file, 0, "Press 'W' to continue...")
+        if wait_for_event(keys=(pygame.K_w,)) == 'quit':
+            return
 
         # Enter cognitive trial
         results = run_trials(screen, font, stimulus, stim_type, settings, profile,
@@ -489,14 +606,15 @@ def main():
             update_progress(args.progress_file, 100, f"Complete ({active})")
 
         # Enter waiting room (blank)
-        while True:
-            if check_for_quit():
-                return
-            screen.fill((0, 0, 0))
-            pygame.display.flip()
-            pygame.time.wait(50)
+        clear_screen(screen)
+        wait_for_event()    # blank until the operator quits
     finally:
-        trigger.close()
+        _interim_writer.shutdown(wait=True)
+        output_dir = session_output_dir(settings.get('paths', {}).get('project_root', ''),
+                                        args.subject_id)
+        write_session_diagnostics(output_dir, args.subject_id, profile.get('appendix', ''), trigger)
+        if args.virtual_clock:
+            print(f"Virtual clock: {now():.1f} s of session time simulated")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 # Import dependencies
-import pygame, random, string, os, sys
-import numpy as np
+import random, string, os, sys
 from pathlib import Path
 
 # Import shared utility functions
@@ -8,8 +7,11 @@ script_dir = Path(__file__).resolve().parent
 parent_dir = script_dir.parent
 sys.path.insert(0, str(parent_dir))
 from auxfunc.paradigm_utils import (
-    check_for_quit, display_message, resolve_display
+    display_message, resolve_display, glyphs, get_scene, clear_screen,
+    outline_surface, assets, wait_for_event, pump_events, now, init_pygame, startup
 )
+import pygame       # first imported (and timed) by paradigm_utils
+startup.mark('imports')
 
 MSG_INTRO          = ['WORKING MEMORY TUTORIAL','PLEASE GET COMFORTABLE BEFORE WE', 
                      'BEGIN THE TUTORIAL','READY?']
@@ -35,12 +37,15 @@ height_screen      = 1080
 
 # Set up pygame
 def init_game():
-    pygame.init()
+    init_pygame(audio=False)
     pygame.display.set_caption("Working Memory Tutorial")
     display_idx, width_screen, height_screen = resolve_display(1, 1920, 1080)
     screen = pygame.display.set_mode((width_screen, height_screen), display=display_idx)
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(None, 120)
+    startup.mark('window open')
+    assets.preload(images=[os.path.join('images', f"nback_{t}_let.png") for t in ('0a', '1a', '2a')])
+    assets.print_report()
     return screen, clock, font
 
 def generate_tutorial_sequence():
@@ -116,6 +121,8 @@ def run_tutorial_trials(screen, font):
     rect_size = height_screen // 2
     rectangle = pygame.Rect((width_screen - rect_size) // 2, (height_screen - rect_size) // 2, rect_size, rect_size)
     rectangle.center = (width_screen // 2, height_screen // 2)
+    border = outline_surface(rectangle.size)
+    scene = get_scene(screen)
     
     resource_path = Path(os.path.dirname(os.path.abspath(__file__))) / '_resources'
     task_instr = ['0a','1a','2a']
@@ -132,33 +139,35 @@ def run_tutorial_trials(screen, font):
         sequence = sequences[trial_num]
         responses = expected_responses[trial_num]
         restart_needed = False
+        glyphs.preload(sequence)
+        scene.show([('border', border, rectangle, 'border')])
                 
         for idx, (stim, resp) in enumerate(zip(sequence, responses)):
-            start_time = pygame.time.get_ticks()
+            start_time = now()
+            onset_time = None
             key_pressed = None
-            timepressed = np.inf
+            timepressed = float('inf')
             
             woodpecker = random.uniform(0.9, 1.1)
             total_duration = woodpecker * (CLC_STIMU + CLC_INTER)
+            stim_text = glyphs.get(stim)
+            stim_rect = stim_text.get_rect(center=(width_screen//2, height_screen//2))
 
-            while pygame.time.get_ticks() - start_time < total_duration:
-                current_time = pygame.time.get_ticks() - start_time
+            while True:
+                current_time = (now() - start_time) * 1000
+                if current_time >= total_duration:
+                    break
                 is_stimulus_phase = current_time < CLC_STIMU
                 
-                screen.fill((0, 0, 0))
-                pygame.draw.rect(screen, (255, 255, 255), rectangle, 2)
-                
                 if is_stimulus_phase:
-                    stim_font = pygame.font.SysFont(None, 300)
-                    text = stim_font.render(str(stim), True, (255, 255, 255))
-                    rect = text.get_rect(center=(width_screen//2, height_screen//2))
-                    screen.blit(text, rect)
+                    scene.set('stimulus', stim_text, stim_rect)
                 else:
-                    pass
-                
-                pygame.display.flip()
+                    scene.remove('stimulus')
+                if scene.present() and onset_time is None:
+                    onset_time = scene.last_flip
 
-                for event in pygame.event.get():
+                next_change = CLC_STIMU if is_stimulus_phase else total_duration
+                for stamp, event in pump_events(next_change - current_time):
                     if event.type == pygame.QUIT:
                         return
                     if event.type == pygame.KEYDOWN:
@@ -166,8 +175,7 @@ def run_tutorial_trials(screen, font):
                             return
                         elif key_pressed is None:
                             key_pressed = event.key
-                            timepressed = current_time / 1000
-                pygame.time.wait(10)
+                            timepressed = stamp - (onset_time or start_time)
             
             user_responded = 1 if key_pressed is not None else 0
 
@@ -196,31 +204,18 @@ def run_tutorial_trials(screen, font):
 def main():
     screen, clock, font = init_game()
     
-    waiting = True
-    while waiting:
-        clock.tick(60)
-        display_message(screen, font, MSG_INTRO,
-                      width_screen=width_screen, height_screen=height_screen)
-        
-        if check_for_quit():
-            return
-            
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_w]:
-            waiting = False
-        pygame.time.wait(50)
+    display_message(screen, font, MSG_INTRO,
+                  width_screen=width_screen, height_screen=height_screen)
+    if wait_for_event(keys=(pygame.K_w,)) == 'quit':
+        return
       
     run_tutorial_trials(screen, font)
     if display_message(screen, font, MSG_CLOSE, CLC_CLOSE,
                       width_screen=width_screen, height_screen=height_screen):
         return
     
-    while True:
-        if check_for_quit():
-            return
-        screen.fill((0,0,0))
-        pygame.display.flip()
-        pygame.time.wait(50)
+    clear_screen(screen)
+    wait_for_event()    # blank until the operator quits
 
 if __name__ == "__main__":
     main()
\ No newline at end of file